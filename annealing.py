@@ -0,0 +1,236 @@
+import math
+import random
+
+from runner import pack_candidates, fit_index
+
+# Exponent floor of the acceptance probability, as in the original loop
+MAX_EXPONENT = -700
+
+
+class AnnealingState:
+    '''
+    ULD contents during annealing. packed_data[bin] holds the packing rows
+    [id, type, x1, y1, z1, x2, y2, z2], bin_cost[bin] their cost and
+    unpacked the parcel rows left over. total is updated by delta on apply(),
+    which returns the proposal that rolls the change back.
+    '''
+
+    def __init__(self, packed_data, bin_cost, unpacked):
+        self.packed_data = {bin: list(rows) for bin, rows in packed_data.items()}
+        self.bin_cost = dict(bin_cost)
+        self.unpacked = list(unpacked)
+        self.position = {row[0]: j for j, row in enumerate(self.unpacked)}
+        self.total = sum(self.bin_cost.values())
+
+    def copy(self):
+        return AnnealingState(self.packed_data, self.bin_cost, self.unpacked)
+
+    def packed_ids(self, bin):
+        return [row[0] for row in self.packed_data.get(bin, [])]
+
+    def discard(self, parcel_id):
+        # Swap-remove from unpacked
+        j = self.position.pop(parcel_id)
+        last = self.unpacked.pop()
+        if j < len(self.unpacked):
+            self.unpacked[j] = last
+            self.position[last[0]] = j
+
+    def apply(self, proposal, parcels):
+        # Parcels leaving the changed bins go to unpacked, unpacked parcels that got placed leave it
+        previous = {bin: (self.packed_data.get(bin, []), self.bin_cost.get(bin, 0)) for bin in proposal.changes}
+        before = set()
+        after = set()
+        for bin, (rows, cost) in proposal.changes.items():
+            before.update(self.packed_ids(bin))
+            after.update(row[0] for row in rows)
+            self.packed_data[bin] = rows
+            self.bin_cost[bin] = cost
+        for parcel_id in before - after:
+            self.position[parcel_id] = len(self.unpacked)
+            self.unpacked.append(parcels[parcel_id])
+        for parcel_id in after - before:
+            if parcel_id in self.position:
+                self.discard(parcel_id)
+        self.total += proposal.delta
+        return Proposal(self, previous)
+
+
+class Proposal:
+    ''' new (rows, cost) per changed bin and the resulting change of total cost '''
+
+    def __init__(self, state, changes):
+        self.changes = changes
+        self.delta = sum(cost - state.bin_cost.get(bin, 0) for bin, (_, cost) in changes.items())
+
+
+def packing_rows(packed_items):
+    # pack_items result to packed_data rows
+    return [
+        [item1[0], item1[5], item2[0], item2[1], item2[2], item2[3], item2[4], item2[5]]
+        for item1, item2 in zip(packed_items[1], packed_items[2])
+    ]
+
+
+class InsertMove:
+    ''' a random unpacked parcel goes into the ULD where it raises the cost most '''
+
+    def propose(self, annealer, state, rng, executor=None):
+        if not state.unpacked:
+            return None
+        element = rng.choice(state.unpacked)
+        bins = [bin for bin in range(len(annealer.uld_list)) if annealer.fits(element[0], bin)]
+        results = annealer.evaluate([(bin, state.packed_ids(bin) + [element[0]]) for bin in bins], executor)
+        best = None
+        for bin, result in zip(bins, results):
+            if result[3] > (best[1][3] if best else 0):
+                best = (bin, result)
+        if best is None:
+            return None
+        return Proposal(state, {best[0]: (packing_rows(best[1]), best[1][3])})
+
+
+class SwapMove:
+    ''' exchange one economy parcel between two ULDs '''
+
+    def propose(self, annealer, state, rng, executor=None):
+        bins = [bin for bin in range(len(annealer.uld_list)) if annealer.movable(state.packed_ids(bin))]
+        if len(bins) < 2:
+            return None
+        a, b = rng.sample(bins, 2)
+        ids_a = state.packed_ids(a)
+        ids_b = state.packed_ids(b)
+        parcel_a = rng.choice(annealer.movable(ids_a))
+        parcel_b = rng.choice(annealer.movable(ids_b))
+        ids_a = [parcel_id for parcel_id in ids_a if parcel_id != parcel_a] + [parcel_b]
+        ids_b = [parcel_id for parcel_id in ids_b if parcel_id != parcel_b] + [parcel_a]
+        result_a, result_b = annealer.evaluate([(a, ids_a), (b, ids_b)], executor)
+        return Proposal(state, {a: (packing_rows(result_a), result_a[3]), b: (packing_rows(result_b), result_b[3])})
+
+
+class RemoveMove:
+    ''' take one economy parcel out of a ULD to make room '''
+
+    def propose(self, annealer, state, rng, executor=None):
+        bins = [bin for bin in range(len(annealer.uld_list)) if annealer.movable(state.packed_ids(bin))]
+        if not bins:
+            return None
+        bin = rng.choice(bins)
+        ids = state.packed_ids(bin)
+        removed = rng.choice(annealer.movable(ids))
+        result, = annealer.evaluate([(bin, [parcel_id for parcel_id in ids if parcel_id != removed])], executor)
+        return Proposal(state, {bin: (packing_rows(result), result[3])})
+
+
+class Annealer:
+    '''
+    Simulated annealing over ULD contents. moves is a list of (move, weight)
+    pairs, a move proposes a change and the annealer accepts it with the
+    Metropolis rule of the original loop. Bins are repacked through the
+    pack cache. run() cools one chain, temper() runs parallel tempering
+    over several fixed-temperature chains.
+    '''
+
+    def __init__(self, uld_list, parcels, is_stable=False, moves=None,
+                 initial_temp=10000, final_temp=0.001, cooling_rate=0.975, patience=None):
+        self.uld_list = uld_list
+        # parcel rows by id, (id, length, width, height, weight, type, cost)
+        self.parcels = parcels
+        self.is_stable = is_stable
+        self.moves = moves if moves is not None else [(InsertMove(), 1)]
+        self.initial_temp = initial_temp
+        self.final_temp = final_temp
+        self.cooling_rate = cooling_rate
+        # Steps without a new best before stopping, None runs the full schedule
+        self.patience = patience
+
+    def fits(self, parcel_id, bin):
+        # Shared by ULDs of one shape through the fit index
+        return fit_index.fits(self.parcels[parcel_id], self.uld_list[bin])
+
+    def movable(self, ids):
+        return [parcel_id for parcel_id in ids if self.parcels[parcel_id][5] == 'Economy']
+
+    def evaluate(self, candidates, executor=None):
+        # pack_items results for (bin, parcel ids) pairs
+        return pack_candidates(
+            [([0, [self.parcels[parcel_id] for parcel_id in ids]], self.uld_list[bin]) for bin, ids in candidates],
+            self.is_stable, executor
+        )
+
+    def accept(self, delta, temperature, rng):
+        if delta > 0:
+            return True
+        return rng.random() < math.exp(max(delta, MAX_EXPONENT) / temperature) and abs(delta) < 10**4
+
+    def step(self, state, temperature, rng, executor=None):
+        # One proposal at temperature, returns True when it was applied
+        moves, weights = zip(*self.moves)
+        move = rng.choices(moves, weights)[0]
+        proposal = move.propose(self, state, rng, executor)
+        if proposal is None or not self.accept(proposal.delta, temperature, rng):
+            return False
+        state.apply(proposal, self.parcels)
+        return True
+
+    def run(self, state, rng=random, executor=None):
+        # Cool from initial_temp to final_temp, returns the best state seen and the cost history
+        best = state.copy()
+        history = [state.total]
+        idle = 0
+        temperature = self.initial_temp
+        while temperature > self.final_temp and (self.patience is None or idle < self.patience):
+            self.step(state, temperature, rng, executor)
+            history.append(state.total)
+            if state.total > best.total:
+                best = state.copy()
+                idle = 0
+            else:
+                idle += 1
+            temperature *= self.cooling_rate
+        return best, history
+
+    def chain(self, state, temperature, steps, seed):
+        # steps proposals at a fixed temperature, run in a worker process by temper()
+        rng = random.Random(seed)
+        best = state.copy()
+        for _ in range(steps):
+            self.step(state, temperature, rng)
+            if state.total > best.total:
+                best = state.copy()
+        return state, best
+
+    def temper(self, state, chains=4, rounds=25, steps=25, executor=None, rng=random):
+        '''
+        Parallel tempering: chains at temperatures spaced geometrically from
+        initial_temp to final_temp run steps proposals each per round, on
+        the executor's processes when there is one, then neighbouring chains
+        exchange states. Stops after rounds, or patience rounds without a
+        new best.
+        '''
+        ratio = (self.final_temp / self.initial_temp) ** (1 / max(chains - 1, 1))
+        temperatures = [self.initial_temp * ratio**k for k in range(chains)]
+        states = [state.copy() for _ in range(chains)]
+        best = state.copy()
+        history = [state.total]
+        idle = 0
+        run_chains = map if executor is None else executor.map
+        for turn in range(rounds):
+            seeds = [rng.randrange(2**32) for _ in range(chains)]
+            results = list(run_chains(self.chain, states, temperatures, [steps] * chains, seeds))
+            states = [chain_state for chain_state, _ in results]
+            round_best = max((chain_best for _, chain_best in results), key=lambda chain_best: chain_best.total)
+            if round_best.total > best.total:
+                best = round_best
+                idle = 0
+            else:
+                idle += 1
+            history.append(best.total)
+            # Exchange neighbours, alternating pairs each round
+            for k in range(turn % 2, chains - 1, 2):
+                gain = (states[k + 1].total - states[k].total) * (1 / temperatures[k] - 1 / temperatures[k + 1])
+                if gain >= 0 or rng.random() < math.exp(max(gain, MAX_EXPONENT)):
+                    states[k], states[k + 1] = states[k + 1], states[k]
+            if self.patience is not None and idle >= self.patience:
+                break
+        return best, history
@@ -0,0 +1,126 @@
+try:
+    from gurobipy import Model, GRB
+except ImportError:
+    Model = GRB = None
+import numpy as np
+
+from runner import PackingSession
+
+
+def parcel_arrays(items, uld_list, fill):
+    # Volumes, weights, values and which ULDs each parcel can physically enter
+    dims = np.array([item[1:4] for item in items], dtype=float).reshape(-1, 3)
+    volume = dims.prod(axis=1)
+    weight = np.array([item[4] for item in items], dtype=float)
+    value = np.array([item[6] for item in items], dtype=float)
+    boxes = np.array([uld[1:4] for uld in uld_list], dtype=float)
+    # Orientation fit is checked once per distinct box and shared by its ULDs
+    shapes, shape_of = np.unique(np.sort(boxes, axis=1), axis=0, return_inverse=True)
+    fits = (np.sort(dims, axis=1)[:, None, :] <= shapes[None, :, :]).all(axis=2)[:, shape_of.ravel()]
+    capacity = fill * boxes.prod(axis=1)
+    limit = np.array([uld[4] for uld in uld_list], dtype=float)
+    return volume, weight, value, fits, capacity, limit
+
+
+def milp_assignment(items, priority, uld_list, k, fill=0.85, time_limit=10):
+    '''
+    Multi-knapsack over all ULDs without coordinates. x[i, u] puts parcel i
+    in ULD u, y[u] marks ULDs carrying priority parcels, which cost k.
+    Volume is capped at fill of each ULD to leave room for geometry.
+    Returns the ULD index per parcel, -1 for unassigned.
+    '''
+    volume, weight, value, fits, capacity, limit = parcel_arrays(items, uld_list, fill)
+    n, m = fits.shape
+    model = Model("ULD_Assignment")
+    x = model.addMVar((n, m), vtype=GRB.BINARY, ub=fits.astype(float), name="x")
+    y = model.addMVar(m, vtype=GRB.BINARY, name="y")
+    model.addConstr(x.sum(axis=1) <= 1)
+    model.addConstr((volume[:, None] * x).sum(axis=0) <= capacity)
+    model.addConstr((weight[:, None] * x).sum(axis=0) <= limit)
+    if priority.any():
+        model.addConstr(x[priority, :].sum(axis=0) <= int(priority.sum()) * y)
+    model.setObjective((value[:, None] * x).sum() - k * y.sum(), GRB.MAXIMIZE)
+    model.setParam('TimeLimit', time_limit)
+    model.optimize()
+    if not model.SolCount:
+        return greedy_assignment(items, priority, uld_list, k, fill)
+    chosen = x.X > 0.5
+    return np.where(chosen.any(axis=1), chosen.argmax(axis=1), -1)
+
+
+def greedy_assignment(items, priority, uld_list, k, fill=0.85):
+    '''
+    Gurobi-free counterpart of milp_assignment. Priority parcels go first
+    fit decreasing into as few ULDs as possible, in uld_list order. Economy
+    parcels then go by value density into the ULD with the most room left.
+    '''
+    volume, weight, value, fits, capacity, limit = parcel_arrays(items, uld_list, fill)
+    n, m = fits.shape
+    room = capacity.copy()
+    load = limit.copy()
+    assigned = np.full(n, -1)
+    opened = []
+    for i in sorted(np.nonzero(priority)[0], key=lambda i: -volume[i]):
+        usable = [u for u in opened + [u for u in range(m) if u not in opened]
+                  if fits[i, u] and room[u] >= volume[i] and load[u] >= weight[i]]
+        if usable:
+            u = usable[0]
+            if u not in opened:
+                opened.append(u)
+            assigned[i], room[u], load[u] = u, room[u] - volume[i], load[u] - weight[i]
+    for i in sorted(np.nonzero(~priority)[0], key=lambda i: -value[i] / volume[i]):
+        usable = [u for u in range(m) if fits[i, u] and room[u] >= volume[i] and load[u] >= weight[i]]
+        if usable:
+            u = max(usable, key=lambda u: room[u] / capacity[u])
+            assigned[i], room[u], load[u] = u, room[u] - volume[i], load[u] - weight[i]
+    return assigned
+
+
+def assign_parcels(priority_items, economy_items, uld_list, k, is_stable=False, solver="milp", fill=0.85):
+    '''
+    Assign every parcel to a ULD with one aggregated model, then check each
+    ULD with pack_items. Parcels that do not fit are repaired into ULDs
+    with room left, priority parcels first and preferably into ULDs that
+    already carry priority. Returns (packed_data, bin_cost, unpacked
+    economy parcels, unpacked priority parcels, number of priority ULDs)
+    in the controller's formats.
+    '''
+    items = list(priority_items) + list(economy_items)
+    priority = np.arange(len(items)) < len(priority_items)
+    if solver == "milp" and Model is not None:
+        assigned = milp_assignment(items, priority, uld_list, k, fill)
+    else:
+        assigned = greedy_assignment(items, priority, uld_list, k, fill)
+
+    sessions = [PackingSession([0, [items[i] for i in np.nonzero(assigned == u)[0]]], uld, is_stable) for u, uld in enumerate(uld_list)]
+    placed = {fitted[0] for session in sessions for fitted in session.result[1]}
+    volume, weight, value, fits, capacity, limit = parcel_arrays(items, uld_list, 1.0)
+
+    # Repair: parcels the geometry rejected or the model left out, priority first then by value density
+    leftovers = sorted((i for i, item in enumerate(items) if str(item[0]) not in placed),
+                       key=lambda i: (not priority[i], -value[i] / volume[i]))
+    for i in leftovers:
+        carries = [any(fitted[5] == "Priority" for fitted in session.result[1]) for session in sessions]
+        order = sorted(range(len(uld_list)), key=lambda u: not carries[u]) if priority[i] else range(len(uld_list))
+        for u in order:
+            result = sessions[u].result
+            if not fits[i, u] or float(result[0]) + volume[i] > capacity[u] or sum(fitted[4] for fitted in result[1]) + weight[i] > limit[u]:
+                continue
+            if any(fitted[0] == str(items[i][0]) for fitted in sessions[u].try_extend([items[i]])[1]):
+                sessions[u].commit()
+                placed.add(str(items[i][0]))
+                break
+            sessions[u].rollback()
+
+    packed_data = {}
+    bin_cost = {}
+    n_p = 0
+    for u, session in enumerate(sessions):
+        fitted_items, coordinates = session.result[1], session.result[2]
+        if fitted_items:
+            packed_data[u] = [[fitted[0], fitted[5], *corners] for fitted, corners in zip(fitted_items, coordinates)]
+            n_p += any(fitted[5] == "Priority" for fitted in fitted_items)
+        bin_cost[u] = session.result[3]
+    unpacked_economy = [item for item in economy_items if str(item[0]) not in placed]
+    unpacked_priority = [item for item in priority_items if str(item[0]) not in placed]
+    return packed_data, bin_cost, unpacked_economy, unpacked_priority, n_p
@@ -1,12 +1,23 @@
-from gurobipy import Model, GRB
-import sys
+try:
+    from gurobipy import Model, GRB
+except ImportError:
+    # Without gurobipy only the heuristic preselection is available
+    Model = GRB = None
+import argparse
 import pprint
 import random
-from runner import pack_items
+from runner import pack_items, pack_cache, fit_index, uld_groups, PackFilter, PackingSession
+from annealing import Annealer, AnnealingState, InsertMove, SwapMove, RemoveMove
+from preselect import preselect_packing, preselect_economy_packing
+from assignment import assign_parcels
+from solve_cache import SolveCache
+from window_search import adaptive_window
 import math
 import csv
 import re
 import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
 
 def calculate_lbh(packed_items):
@@ -25,223 +36,283 @@ def standardize(values):
     std_dev = math.sqrt(variance)
     return [(x - mean) / std_dev if std_dev != 0 else 0 for x in values]
 
-def solve_packing(items, box_length, box_width, box_height, box_weight_limit):
-    model = Model("3D_Packing")
-    cost=0
-    n = len(items)
-    # Binary variables indicating if an item is selected
-    S = model.addVars(n, vtype=GRB.BINARY, name="S")
-
-    # Continuous variables for coordinates and rotated dimensions
-    X = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_length, name="X")
-    Y = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_width, name="Y")
-    Z = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_height, name="Z")
-    X_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_length, name="X_r")
-    Y_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_width, name="Y_r")
-    Z_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_height, name="Z_r")
-
-    # Rotation matrix variables
-    T = model.addVars(n, 3, 3, vtype=GRB.BINARY, name="T")
-
-    # Add constraints for the rotation matrix
-    for i in range(n):
-        for j in range(3):
-            model.addConstr(T.sum(i, j, '*') == S[i], f"Row_{i}_{j}")
-            model.addConstr(T.sum(i, '*', j) == S[i], f"Col_{i}_{j}")
-        # Link rotated dimensions with rotation matrix and coordinates
-        model.addConstr(X_r[i] == X[i] + T[i, 0, 0] * items[i][1] +
-                                    T[i, 0, 1] * items[i][2] +
-                                    T[i, 0, 2] * items[i][3])
-        model.addConstr(Y_r[i] == Y[i] + T[i, 1, 0] * items[i][1] +
-                                    T[i, 1, 1] * items[i][2] +
-                                    T[i, 1, 2] * items[i][3])
-        model.addConstr(Z_r[i] == Z[i] + T[i, 2, 0] * items[i][1] +
-                                    T[i, 2, 1] * items[i][2] +
-                                    T[i, 2, 2] * items[i][3])
-
-        # Enforce boundary constraints
-        model.addConstr(X_r[i] <= box_length * S[i])
-        model.addConstr(Y_r[i] <= box_width * S[i])
-        model.addConstr(Z_r[i] <= box_height * S[i])
-
-    # Add non-overlapping constraints
-    for i in range(n):
-        for j in range(i + 1, n):
-            L = model.addVar(vtype=GRB.BINARY, name=f"L_{i}_{j}")
-            R = model.addVar(vtype=GRB.BINARY, name=f"R_{i}_{j}")
-            F = model.addVar(vtype=GRB.BINARY, name=f"F_{i}_{j}")
-            B = model.addVar(vtype=GRB.BINARY, name=f"B_{i}_{j}")
-            U = model.addVar(vtype=GRB.BINARY, name=f"U_{i}_{j}")
-            O = model.addVar(vtype=GRB.BINARY, name=f"O_{i}_{j}")
-
-            model.addConstr(L + R + F + B + U + O >= S[i] + S[j] - 1)
-
-            model.addConstr(X_r[i] <= X[j] + box_length * (1 - L))
-            model.addConstr(X_r[j] <= X[i] + box_length * (1 - R))
-            model.addConstr(Y_r[i] <= Y[j] + box_width * (1 - F))
-            model.addConstr(Y_r[j] <= Y[i] + box_width * (1 - B))
-            model.addConstr(Z_r[i] <= Z[j] + box_height * (1 - U))
-            model.addConstr(Z_r[j] <= Z[i] + box_height * (1 - O))
-
-    # Weight constraint
-    model.addConstr(sum(S[i] * items[i][3] for i in range(n)) <= box_weight_limit)
-
-    # Objective: Maximize the number of items packed
-    model.setObjective(sum(S[i] for i in range(n)), GRB.MAXIMIZE)
-
-    model.setParam('TimeLimit',20)
-
-    # Solve the model
-    model.optimize()
-
-    # Save results to CSV
-    packed_items = []
-    total_volume = 0
-
-    if model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT:
-        for i in range(n):
-            if S[i].x > 0.5:
-                x_start = X[i].x
-                y_start = Y[i].x
-                z_start = Z[i].x
-                x_end = X_r[i].x
-                y_end = Y_r[i].x
-                z_end = Z_r[i].x
-                cost+=10**9
-                
-                # Calculate the volume of the item
-                item_volume = (x_end-x_start) * (y_end-y_start) * (z_end-z_start)
-                total_volume += item_volume
-
+class PackingModel:
+    '''
+    3D packing MILP for one ULD shape, kept between ULDs and built with the
+    matrix API. It is built for a set of parcels. Later solves on a subset
+    fix S[i]=0 for the missing ones instead of rebuilding, and can take a
+    pack_items placement as MIP start. objective is "count" (priority phase)
+    or "cost" (economy phase).
+
+    reduce drops separation binaries and pairs that can never both be packed.
+    It also orders identical parcels and adds volume, weight and cardinality
+    cover cuts. lazy leaves the big-M non-overlap rows out of the model and
+    adds them from a callback for pairs that overlap in an incumbent.
+    '''
+
+    def __init__(self, items, box_length, box_width, box_height, box_weight_limit, objective, time_limit, reduce=True, lazy=False):
+        self.items = list(items)
+        self.index = {item[0]: i for i, item in enumerate(self.items)}
+        self.objective = objective
+        self.box = np.array([box_length, box_width, box_height], dtype=float)
+        self.lazy = lazy
+        self.model = model = Model("3D_Packing")
+        n = len(items)
+        dims = np.array([item[1:4] for item in items], dtype=float).reshape(n, 3)
+        weight = np.array([item[4] for item in items], dtype=float)
+        volume = dims.prod(axis=1)
+        box_volume = self.box.prod()
+        self.dims = dims
+
+        # S: item selected, low/high: X, Y, Z and X_r, Y_r, Z_r, T[i, a, k]: axis a holds dimension k
+        S = self.S = model.addMVar(n, vtype=GRB.BINARY, name="S")
+        low = self.low = model.addMVar((n, 3), lb=0, ub=np.tile(self.box, (n, 1)), name="P")
+        high = self.high = model.addMVar((n, 3), lb=0, ub=np.tile(self.box, (n, 1)), name="P_r")
+        T = self.T = model.addMVar((n, 3, 3), vtype=GRB.BINARY, name="T")
+
+        for a in range(3):
+            # Rotation matrix rows and columns are permutations of the selected items
+            model.addConstr(T[:, a, :].sum(axis=1) == S)
+            model.addConstr(T[:, :, a].sum(axis=1) == S)
+            # Link rotated dimensions with rotation matrix and coordinates
+            model.addConstr(high[:, a] == low[:, a] + (T[:, a, :] * dims).sum(axis=1))
+            # Enforce boundary constraints
+            model.addConstr(high[:, a] <= self.box[a] * S)
+
+        # Candidate pairs and the axes along which each can be separated
+        I, J = np.triu_indices(n, 1)
+        if reduce:
+            smallest = dims.min(axis=1)
+            axes = (smallest[I] + smallest[J])[:, None] <= self.box[None, :]
+            conflict = (weight[I] + weight[J] > box_weight_limit) | (volume[I] + volume[J] > box_volume) | ~axes.any(axis=1)
+            if conflict.any():
+                model.addConstr(S[I[conflict]] + S[J[conflict]] <= 1)
+            I, J, axes = I[~conflict], J[~conflict], axes[~conflict]
+        else:
+            axes = np.ones((len(I), 3), dtype=bool)
+
+        # Add non-overlapping constraints, pairs with the same separable axes share a block of binaries
+        self.blocks = []
+        for pattern in sorted({tuple(row) for row in axes.tolist()}):
+            rows = (axes == pattern).all(axis=1)
+            block_axes = [a for a in range(3) if pattern[a]]
+            sep = model.addMVar((int(rows.sum()), 2 * len(block_axes)), vtype=GRB.BINARY, name="sep")
+            block = (I[rows], J[rows], block_axes, sep)
+            self.blocks.append(block)
+            model.addConstr(sep.sum(axis=1) >= S[I[rows]] + S[J[rows]] - 1)
+            if not lazy:
+                self.add_separation(block)
+        if lazy:
+            self.pair_block = {(i, j): (block, row) for block in self.blocks for row, (i, j) in enumerate(zip(block[0].tolist(), block[1].tolist()))}
+
+        # Weight constraint
+        model.addMConstr(weight[None, :], S, '<', np.array([box_weight_limit], dtype=float))
+
+        self.symmetry = None
+        self.groups = {}
+        if reduce:
+            self.add_cuts(volume, weight, box_volume, box_weight_limit)
+            # Identical parcels are selected in index order and placed with growing X
+            for i, item in enumerate(items):
+                self.groups.setdefault(tuple(item[1:]), []).append(i)
+            chain = np.array([(i, j) for group in self.groups.values() for i, j in zip(group, group[1:])], dtype=int).reshape(-1, 2)
+            if len(chain):
+                self.symmetry = (chain,
+                    model.addConstr(S[chain[:, 1]] - S[chain[:, 0]] <= 0),
+                    model.addConstr(low[chain[:, 0], 0] - low[chain[:, 1], 0] + box_length * S[chain[:, 1]] <= box_length))
+
+        if objective == "count":
+            # Objective: Maximize the number of items packed
+            model.setObjective(S.sum(), GRB.MAXIMIZE)
+        else:
+            model.setObjective(np.array([item[6] for item in items], dtype=float) @ S, GRB.MAXIMIZE)
+
+        model.setParam('TimeLimit',time_limit)
+
+    def add_separation(self, block, rows=slice(None)):
+        # Big-M rows of a pair block, item I before J and J before I along each separable axis
+        I, J, block_axes, sep = block
+        for s, a in enumerate(block_axes):
+            self.model.addConstr(self.high[I[rows], a] <= self.low[J[rows], a] + self.box[a] * (1 - sep[rows, 2 * s]))
+            self.model.addConstr(self.high[J[rows], a] <= self.low[I[rows], a] + self.box[a] * (1 - sep[rows, 2 * s + 1]))
+
+    def add_cuts(self, volume, weight, box_volume, box_weight_limit):
+        # Valid inequalities from the volume and weight knapsacks
+        model, S = self.model, self.S
+        n = len(volume)
+        model.addMConstr(volume[None, :], S, '<', np.array([box_volume], dtype=float))
+        for sizes, limit in ((volume, box_volume), (weight, box_weight_limit)):
+            # No more parcels than the smallest ones that fit
+            count = int(np.searchsorted(np.cumsum(np.sort(sizes)), limit, side='right'))
+            if count < n:
+                model.addConstr(S.sum() <= count)
+            # Minimal cover of the largest parcels
+            order = np.argsort(-sizes, kind='stable')
+            over = np.nonzero(np.cumsum(sizes[order]) > limit)[0]
+            if len(over):
+                cover = order[:over[0] + 1]
+                model.addConstr(S[cover].sum() <= len(cover) - 1)
+
+    def callback(self, model, where):
+        # Lazy non-overlap rows for overlapping pairs of a new incumbent
+        if where != GRB.Callback.MIPSOL:
+            return
+        selected = np.nonzero(model.cbGetSolution(self.S) > 0.5)[0]
+        low = model.cbGetSolution(self.low)[selected]
+        high = model.cbGetSolution(self.high)[selected]
+        overlap = ((low[:, None, :] < high[None, :, :] - 1e-6) & (low[None, :, :] < high[:, None, :] - 1e-6)).all(axis=2)
+        for a, b in zip(*np.nonzero(np.triu(overlap, 1))):
+            i, j = int(selected[a]), int(selected[b])
+            if (i, j) in self.pair_block and (i, j) not in self.lazy_pairs:
+                self.lazy_pairs.add((i, j))
+                (I, J, block_axes, sep), row = self.pair_block[i, j]
+                for s, axis in enumerate(block_axes):
+                    box = self.box[axis]
+                    model.cbLazy(self.high[i, axis].item() <= self.low[j, axis].item() + box * (1 - sep[row, 2 * s].item()))
+                    model.cbLazy(self.high[j, axis].item() <= self.low[i, axis].item() + box * (1 - sep[row, 2 * s + 1].item()))
+
+    def covers(self, items):
+        return all(item[0] in self.index and tuple(self.items[self.index[item[0]]]) == tuple(item) for item in items)
+
+    def set_start(self, packing, active):
+        # MIP start from a pack_items result, parcels it did not place start unselected
+        n = len(self.items)
+        placed = {}
+        for fitted, coordinates in zip(packing[1], packing[2]):
+            i = self.index.get(fitted[0])
+            if i is not None and active[i]:
+                placed[i] = coordinates
+        # Hand the placements of identical parcels out in the order the symmetry rows expect
+        for group in self.groups.values():
+            members = [i for i in group if active[i]]
+            spots = sorted((placed.pop(i) for i in members if i in placed), key=lambda spot: spot[0])
+            placed.update(zip(members, spots))
+        selected = np.zeros(n)
+        boxes = np.zeros((n, 6))
+        T = np.zeros((n, 3, 3))
+        for i, coordinates in placed.items():
+            selected[i] = 1
+            boxes[i] = coordinates
+            # Axis a holds item dimension k
+            free = [0, 1, 2]
+            for a in range(3):
+                k = min(free, key=lambda k: abs(self.dims[i, k] - (boxes[i, a + 3] - boxes[i, a])))
+                free.remove(k)
+                T[i, a, k] = 1
+        self.S.Start = selected
+        self.low.Start = boxes[:, :3]
+        self.high.Start = boxes[:, 3:]
+        self.T.Start = T
+        for I, J, block_axes, sep in self.blocks:
+            both = (selected[I] * selected[J])[:, None]
+            sides = [np.stack([boxes[I, a + 3] <= boxes[J, a], boxes[J, a + 3] <= boxes[I, a]], axis=1) for a in block_axes]
+            sep.Start = np.concatenate(sides, axis=1) * both
+
+    def solve(self, items, start=None):
+        offered = {item[0] for item in items}
+        active = np.array([item[0] in offered for item in self.items], dtype=bool)
+        self.S.UB = active.astype(float)
+        # Symmetry rows only hold between parcels that are both offered
+        if self.symmetry is not None:
+            chain, select, order = self.symmetry
+            both = active[chain[:, 0]] & active[chain[:, 1]]
+            select.RHS = np.where(both, 0, 1)
+            order.RHS = np.where(both, 1, 2) * self.box[0]
+        self.model.update()
+        if start is not None:
+            self.set_start(start, active)
+        else:
+            self.model.setAttr('Start', self.model.getVars(), [GRB.UNDEFINED] * self.model.NumVars)
+
+        # Solve the model
+        if self.lazy:
+            self.lazy_pairs = set()
+            self.model.Params.LazyConstraints = 1
+            self.model.optimize(self.callback)
+        else:
+            self.model.optimize()
+
+        packed_items = []
+        total_volume = 0
+        cost=0
+
+        if self.model.SolCount and (self.model.status == GRB.OPTIMAL or self.model.status == GRB.TIME_LIMIT):
+            chosen = np.nonzero(self.S.X > 0.5)[0]
+            # Calculate the volume of the items from their packed extents
+            total_volume = float((self.high.X[chosen] - self.low.X[chosen]).prod(axis=1).sum())
+            for i in chosen.tolist():
+                item = self.items[i]
+                cost+=10**9 if self.objective == "count" else item[6]
                 # Add the packed item to the list with ID, dimensions, weight, and cost
-                packed_items.append((
-                    items[i][0],  # ID
-                    items[i][1],  # Length
-                    items[i][2],   # Width
-                    items[i][3],  # Height
-                    items[i][4],  # Weight
-                    items[i][5],  # Item type
-                    items[i][6]   # Item cost
-                ))
+                packed_items.append(tuple(item[:7]))
 
-    # Return total volume and packed items list
-    return [total_volume, packed_items,cost]
+        # Return total volume and packed items list
+        return [total_volume, packed_items, cost]
 
-def solve_economy_packing(items, box_length, box_width, box_height, box_weight_limit):
-    model = Model("3D_Packing")
 
-    n = len(items)
-    # Binary variables indicating if an item is selected
-    S = model.addVars(n, vtype=GRB.BINARY, name="S")
+# One model per (objective, ULD shape), reused while it covers the parcels asked for
+packing_models = {}
 
-    # Continuous variables for coordinates and rotated dimensions
-    X = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_length, name="X")
-    Y = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_width, name="Y")
-    Z = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_height, name="Z")
-    X_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_length, name="X_r")
-    Y_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_width, name="Y_r")
-    Z_r = model.addVars(n, vtype=GRB.CONTINUOUS, lb=0, ub=box_height, name="Z_r")
+# Gurobi time limits in seconds per ULD
+PRIORITY_TIME_LIMIT = 20
+ECONOMY_TIME_LIMIT = 100
 
-    # Rotation matrix variables
-    T = model.addVars(n, 3, 3, vtype=GRB.BINARY, name="T")
+def packing_model(items, box_length, box_width, box_height, box_weight_limit, objective, time_limit, reduce=True, lazy=False):
+    key = (objective, box_length, box_width, box_height, box_weight_limit, reduce, lazy)
+    if key not in packing_models or not packing_models[key].covers(items):
+        packing_models[key] = PackingModel(items, box_length, box_width, box_height, box_weight_limit, objective, time_limit, reduce, lazy)
+    return packing_models[key]
 
-    # Add constraints for the rotation matrix
-    for i in range(n):
-        for j in range(3):
-            model.addConstr(T.sum(i, j, '*') == S[i], f"Row_{i}_{j}")
-            model.addConstr(T.sum(i, '*', j) == S[i], f"Col_{i}_{j}")
-        
-        # Link rotated dimensions with rotation matrix and coordinates
-        model.addConstr(X_r[i] == X[i] + T[i, 0, 0] * items[i][1] +
-                                     T[i, 0, 1] * items[i][2] +
-                                     T[i, 0, 2] * items[i][3])
-        model.addConstr(Y_r[i] == Y[i] + T[i, 1, 0] * items[i][1] +
-                                     T[i, 1, 1] * items[i][2] +
-                                     T[i, 1, 2] * items[i][3])
-        model.addConstr(Z_r[i] == Z[i] + T[i, 2, 0] * items[i][1] +
-                                     T[i, 2, 1] * items[i][2] +
-                                     T[i, 2, 2] * items[i][3])
-
-        # Enforce boundary constraints
-        model.addConstr(X_r[i] <= box_length * S[i])
-        model.addConstr(Y_r[i] <= box_width * S[i])
-        model.addConstr(Z_r[i] <= box_height * S[i])
-
-    # Add non-overlapping constraints
-    for i in range(n):
-        for j in range(i + 1, n):
-            L = model.addVar(vtype=GRB.BINARY, name=f"L_{i}_{j}")
-            R = model.addVar(vtype=GRB.BINARY, name=f"R_{i}_{j}")
-            F = model.addVar(vtype=GRB.BINARY, name=f"F_{i}_{j}")
-            B = model.addVar(vtype=GRB.BINARY, name=f"B_{i}_{j}")
-            U = model.addVar(vtype=GRB.BINARY, name=f"U_{i}_{j}")
-            O = model.addVar(vtype=GRB.BINARY, name=f"O_{i}_{j}")
-
-            model.addConstr(L + R + F + B + U + O >= S[i] + S[j] - 1)
-
-            model.addConstr(X_r[i] <= X[j] + box_length * (1 - L))
-            model.addConstr(X_r[j] <= X[i] + box_length * (1 - R))
-            model.addConstr(Y_r[i] <= Y[j] + box_width * (1 - F))
-            model.addConstr(Y_r[j] <= Y[i] + box_width * (1 - B))
-            model.addConstr(Z_r[i] <= Z[j] + box_height * (1 - U))
-            model.addConstr(Z_r[j] <= Z[i] + box_height * (1 - O))
-
-    # Weight constraint
-    model.addConstr(sum(S[i] * items[i][3] for i in range(n)) <= box_weight_limit)
-
-    # Objective: Maximize the number of items packed
-    model.setObjective(sum(S[i]*items[i][6] for i in range(n)), GRB.MAXIMIZE)
-
-    model.setParam('TimeLimit',100)
-
-    # Solve the model
-    model.optimize()
-
-    packed_items = []
-    total_volume = 0
-    cost=0
-
-    if model.status == GRB.OPTIMAL or model.status == GRB.TIME_LIMIT:
-        for i in range(n):
-            if S[i].x > 0.5:
-                x_start = X[i].x
-                y_start = Y[i].x
-                z_start = Z[i].x
-                x_end = X_r[i].x
-                y_end = Y_r[i].x
-                z_end = Z_r[i].x
-
-                cost+=items[i][6]
-        
-                # Calculate the dimensions of the item in the packed position
-                # Calculate the volume of the item
-                item_volume = (x_end-x_start) * (y_end-y_start) * (z_end-z_start)
-                total_volume += item_volume
+def solve_packing(items, box_length, box_width, box_height, box_weight_limit, start=None, reduce=True, lazy=False, time_limit=PRIORITY_TIME_LIMIT):
+    model = packing_model(items, box_length, box_width, box_height, box_weight_limit, "count", time_limit, reduce, lazy)
+    return model.solve(items, start)
 
-                # Add the packed item to the list with ID, dimensions, weight, and cost
-                packed_items.append((
-                    items[i][0],  # ID
-                    items[i][1],  # Length
-                    items[i][2],   # Width
-                    items[i][3],  # Height
-                    items[i][4],  # Weight
-                    items[i][5],  # Item Type
-                    items[i][6]   # cost
-                ))
+def solve_economy_packing(items, box_length, box_width, box_height, box_weight_limit, start=None, reduce=True, lazy=False, time_limit=ECONOMY_TIME_LIMIT):
+    model = packing_model(items, box_length, box_width, box_height, box_weight_limit, "cost", time_limit, reduce, lazy)
+    result = model.solve(items, start)
 
     # Save results to CSV
     with open("packed_items.csv", "w", newline="") as csvfile:
         csvwriter = csv.writer(csvfile)
         csvwriter.writerow(["ID", "Length", "Width", "Height", "Weight", "Value", "Cost"])  # Header row
-        for item in packed_items:
+        for item in result[1]:
             csvwriter.writerow(item)
 
     print("Results saved to packed_items.csv")
 
     # Return total volume and packed items list
-    return [total_volume, packed_items,cost]
+    return result
+
+
+def mip_start(preselector, items, uld, is_stable=False):
+    # pack_items placement of the heuristic selection, used as MIP start
+    selection = preselector(items, uld[1], uld[2], uld[3], uld[4], is_stable)
+    return pack_items([0, selection[1]], uld, is_stable)
+
+
+def cached_solve(solve, preselector, items, uld, time_limit, is_stable=False, cache=None, reduce=True, lazy=False):
+    '''
+    solve(items, *box, start, reduce, lazy, time_limit) behind the persistent
+    solve cache, every setting is part of the key. A hit returns the stored
+    selection. On a miss the MIP start is the better of the heuristic
+    selection and the nearest stored selection, each packed by pack_items.
+    '''
+    if cache is None:
+        return solve(items, *uld[1:5], start=mip_start(preselector, items, uld, is_stable), reduce=reduce, lazy=lazy, time_limit=time_limit)
+    params = (is_stable, time_limit, reduce, lazy)
+    selection = cache.get(solve.__name__, uld[1:5], items, params)
+    if selection is None:
+        start = mip_start(preselector, items, uld, is_stable)
+        near = cache.nearest(solve.__name__, uld[1:5], items, params)
+        if near is not None:
+            near_start = pack_items([0, near[1]], uld, is_stable)
+            if near_start[3] > start[3]:
+                start = near_start
+        selection = solve(items, *uld[1:5], start=start, reduce=reduce, lazy=lazy, time_limit=time_limit)
+        cache.put(solve.__name__, uld[1:5], items, params, selection)
+    return selection
+
 
-        
 def find_average(items,box):
     sum1=sum2=sum3=sum4=0
     n=len(items)
@@ -276,13 +347,119 @@ def find_weight(items,box):
     print(box[3]/avg)
     
     
+def probe_windows(session, items, sizes, executor=None):
+    # (result, extended session copy) of extending the session with each window items[-size:], probed concurrently on the executor
+    windows = [items[-size:] for size in sizes]
+    if executor is None:
+        return [(session.probe(window), None) for window in windows]
+    # Windows the pack filter rules out keep the committed result and are not sent to the workers
+    probes = [(session.result, None) if session.pack_filter.reason(session, window) else None for window in windows]
+    pending = [j for j, probe in enumerate(probes) if probe is None]
+    for j, copy in zip(pending, executor.map(PackingSession.extended, [session] * len(pending), [windows[j] for j in pending])):
+        probes[j] = (copy.result, copy)
+    return probes
+
+
+def accept_best(session, items, sizes, probes, cost, accept):
+    # Commit the best accepted window, returns (size, packing) or None when every window was rejected
+    best = None
+    for size, (result, copy) in zip(sizes, probes):
+        if accept(result[3], cost) and (best is None or result[3] > best[1][3]):
+            best = (size, result, copy)
+    if best is None:
+        return None
+    size, result, copy = best
+    if copy is not None:
+        # The worker's packing is kept, the window is not packed again
+        session.adopt(copy)
+    else:
+        session.try_extend(items[-size:])
+        session.commit()
+    return size, session.result
+
+
+def speculative_cwnd(session, items, packed_items, bin_volume, accept, executor=None, batch=4):
+    # cwnd doubling loop, batch doublings are packed per round
+    cwnd=1
+    while (packed_items[0]<0.80*bin_volume and cwnd<len(items)):
+        sizes = sorted({min(cwnd * 2**b, len(items)) for b in range(1, batch + 1)})
+        best = accept_best(session, items, sizes, probe_windows(session, items, sizes, executor), packed_items[3], accept)
+        if best is None:
+            break
+        cwnd, packed_items = best
+    return packed_items
+
+
+def speculative_ack(session, items, packed_items, accept, executor=None, batch=5):
+    # ack_count loop, batch consecutive window sizes are packed per round
+    window_size=0
+    ack_count=0
+    while (ack_count<5):
+        sizes = list(range(window_size + 1, window_size + batch + 1))
+        best = accept_best(session, items, sizes, probe_windows(session, items, sizes, executor), packed_items[3], accept)
+        if best is None:
+            window_size+=batch
+            ack_count+=batch
+        else:
+            window_size, packed_items = best
+            ack_count=0
+    return packed_items
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pack the parcels of data_file.csv into its ULDs")
+    parser.add_argument("stable", nargs="?", default="False", choices=["True", "False"],
+                        help="check stability of every placement (default False)")
+    # Worker processes for the annealing fan-out over ULDs and the window batches, 1 packs in this process
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes, capped at the number of ULDs (default 1)")
+    # Window sizes packed per round in the fill loops, 0 keeps the one-at-a-time loops
+    parser.add_argument("--batch", type=int, default=0,
+                        help="window sizes probed per round in the fill loops, needs --workers above 1, 0 probes one at a time (default 0)")
+    # Parallel tempering chains for the annealing phase, 1 runs a single cooling chain
+    parser.add_argument("--chains", type=int, default=1,
+                        help="parallel tempering chains, 1 runs a single cooling chain (default 1)")
+    # Parcel preselection per phase, one value for both phases or "priority,economy"
+    parser.add_argument("--solvers", default="milp" if Model is not None else "heuristic",
+                        help='"milp" or "heuristic", or "priority,economy" per phase (default milp when Gurobi is installed)')
+    # First stage, "sequential" fills ULDs one at a time, "assignment" assigns all parcels with one aggregated model
+    parser.add_argument("--stage", default="sequential", choices=["sequential", "assignment"],
+                        help="fill ULDs one at a time or assign all parcels at once first (default sequential)")
+    # Persistent cache of MILP results
+    parser.add_argument("--solve-cache", default="solve_cache.sqlite",
+                        help='SQLite file caching MILP results, "none" disables it (default solve_cache.sqlite)')
+    # Window loops, "tcp" keeps the cwnd doubling and ack_count loops, "adaptive" runs an exponential and binary window search
+    parser.add_argument("--search", default="tcp", choices=["tcp", "adaptive"],
+                        help="window search of the fill loops (default tcp)")
+    # Annealing moves, "insert" is the original schedule
+    parser.add_argument("--moves", default="insert", choices=["insert", "mixed"],
+                        help="annealing moves, insert only over the full cooling schedule, or mixed insert/swap/remove "
+                             "stopping after 200 steps without improvement (default insert)")
+    return parser.parse_args()
+
+
 def main():
     start_time = time.time()
-    is_stable=False
-    if len(sys.argv) < 2:
-        is_stable=False
+    args=parse_args()
+    is_stable=args.stable=="True"
+    workers=args.workers
+    batch=args.batch
+    chains=args.chains
+    solvers=(args.solvers.split(",")*2)[:2]
+    stage=args.stage
+    search=args.search
+    # The cache file is only opened when a fill phase solves with the MILP, the assignment stage skips them
+    uses_milp=Model is not None and stage=="sequential" and "milp" in solvers
+    solve_cache=SolveCache(args.solve_cache) if args.solve_cache!="none" and uses_milp else None
+    # The MILP reuses one model per ULD shape and starts from the heuristic selection as packed by pack_items
+    if solvers[0]=="milp":
+        priority_solver=lambda items, uld: cached_solve(solve_packing, preselect_packing, items, uld, PRIORITY_TIME_LIMIT, is_stable, solve_cache)
     else:
-        is_stable=sys.argv[1]
+        priority_solver=lambda items, uld: preselect_packing(items, *uld[1:5], is_stable)
+    if solvers[1]=="milp":
+        economy_solver=lambda items, uld: cached_solve(solve_economy_packing, preselect_economy_packing, items, uld, ECONOMY_TIME_LIMIT, is_stable, solve_cache)
+    else:
+        economy_solver=lambda items, uld: preselect_economy_packing(items, *uld[1:5], is_stable)
     priority_items = []
     sorted_economy_items = []
     uld_list = []
@@ -376,9 +553,21 @@ def main():
     uld_items_with_metric.sort(key=lambda x: x[0],reverse=True)
 
     uld_list = [item for _, item in uld_items_with_metric]
+    # More workers than ULDs would sit idle in the annealing fan-out
+    workers=min(workers,len(uld_list))
+    executor=ProcessPoolExecutor(workers) if workers > 1 else None
+    # Without workers the batched probes would run one after another, the serial loops pack less
+    if executor is None:
+        batch=0
 
 
     print(uld_items_with_metric)
+    # ULDs of one shape share the MILP, the pack cache and the fit checks of annealing
+    print("ULD groups:",list(uld_groups(uld_list).values()))
+    # Which parcels fit each ULD shape, used to skip window packs that cannot place anything
+    fit_index.build(priority_items+economy_items, uld_list)
+    # Counts the window probes of all ULD sessions below
+    window_filter=PackFilter()
 
 
 
@@ -390,43 +579,54 @@ def main():
 
     n_p=0
 
+    if stage=="assignment":
+        # Geometry is only checked per ULD with pack_items, the fill loops below are skipped
+        packed_data, bin_cost, sorted_economy_items, priority_items, n_p = assign_parcels(
+            priority_items, sorted_economy_items, uld_list, k, is_stable, solvers[1])
+        incurred_cost+=k*n_p
+        cost=sum(bin_cost.values())
+        i=len(uld_list)
+
     while (priority_items and i<len(uld_list)):
         n_p+=1
         incurred_cost+=k
         current_bin=i
         current_bin_volume=uld_list[current_bin][1]*uld_list[current_bin][2]*uld_list[current_bin][3]
-        temp_items=solve_packing(priority_items,uld_list[current_bin][1],uld_list[current_bin][2],uld_list[current_bin][3],uld_list[current_bin][4])
-        packed_items=pack_items([0,temp_items[1]],uld_list[current_bin], is_stable)
-        item_list=[]
-        for key in packed_items[1]:
-            item_list.append(key)
+        temp_items=priority_solver(priority_items,uld_list[current_bin])
+        # The ULD is packed once, window probes only place the extra parcels
+        session=PackingSession([0,temp_items[1]],uld_list[current_bin], is_stable, pack_filter=window_filter)
+        packed_items=session.result
         volume=packed_items[0]
         cost=packed_items[3]
         cwnd=1
         previous_packing=packed_items[1]
-        while (volume<0.80*current_bin_volume):
+        if batch:
+            packed_items=speculative_cwnd(session, sorted_economy_items, packed_items, current_bin_volume, lambda new, old: new > old, executor, batch)
+            volume=packed_items[0]
+            cost=packed_items[3]
+        elif search=="adaptive":
+            packed_items=adaptive_window(session, sorted_economy_items, packed_items, lambda new, old: new > old, 0.80*current_bin_volume)
+            volume=packed_items[0]
+            cost=packed_items[3]
+        while (not batch and search=="tcp" and volume<0.80*current_bin_volume):
             # STILL VOLUME IS LEFT IN THE BOX
             cwnd = cwnd * 2
             last_items = sorted_economy_items[-cwnd:]
-            item_list.extend(last_items)
-            new_packing = pack_items([0, item_list], uld_list[current_bin], is_stable)
+            new_packing = session.try_extend(last_items)
         
             new_volume = new_packing[0]
             new_cost=new_packing[3]
             
             if new_cost > cost:
+                session.commit()
                 packed_items = new_packing
                 volume = new_volume
                 cost=new_cost
             else:
+                session.rollback()
                 break            
-            for item in last_items:
-                item_list.remove(item)  
         window_size = 0
         ack_count=0
-        item_list=[]
-        for item in packed_items[1]:
-            item_list.append(item)
         
         packed_ids = {item[0] for item in packed_items[1]}
         dropout=[]
@@ -438,22 +638,29 @@ def main():
 
         previous_packing=packed_items[1]
 
-        while (ack_count<5):
+        if batch:
+            packed_items=speculative_ack(session, sorted_economy_items, packed_items, lambda new, old: new > old, executor, batch)
+            volume=packed_items[0]
+            cost=packed_items[3]
+        elif search=="adaptive":
+            packed_items=adaptive_window(session, sorted_economy_items, packed_items, lambda new, old: new > old)
+            volume=packed_items[0]
+            cost=packed_items[3]
+        while (not batch and search=="tcp" and ack_count<5):
             window_size+=1
             last_items = sorted_economy_items[-window_size:]
-            item_list.extend(last_items)
-            new_packing = pack_items([0, item_list], uld_list[current_bin], is_stable)
+            new_packing = session.try_extend(last_items)
             new_volume = new_packing[0]
             new_cost=new_packing[3]
             if new_cost > cost:
+                session.commit()
                 packed_items = new_packing
                 volume = new_volume
                 cost=new_cost
                 ack_count=0
             else:
+                session.rollback()
                 ack_count+=1
-            for item in last_items:
-                item_list.remove(item)  
 
         packed_ids={item[0] for item in packed_items[1]}
         dropout=[]
@@ -494,11 +701,9 @@ def main():
         for j in range(i,len(uld_list)):
             current_bin=j
             current_bin_volume=uld_list[current_bin][1]*uld_list[current_bin][2]*uld_list[current_bin][3]
-            temp_items=solve_economy_packing(sorted_economy_items,uld_list[current_bin][1],uld_list[current_bin][2],uld_list[current_bin][3],uld_list[current_bin][4])
-            packed_items=pack_items([0,temp_items[1]],uld_list[current_bin], is_stable)
-            item_list=[]
-            for key in packed_items[1]:
-                item_list.append(key)
+            temp_items=economy_solver(sorted_economy_items,uld_list[current_bin])
+            session=PackingSession([0,temp_items[1]],uld_list[current_bin], is_stable, pack_filter=window_filter)
+            packed_items=session.result
             volume=packed_items[0]
             cost=packed_items[3]
             cwnd=1
@@ -507,57 +712,66 @@ def main():
 
 
 
-            while (volume<0.80*current_bin_volume):
+            if batch:
+                packed_items=speculative_cwnd(session, sorted_economy_items, packed_items, current_bin_volume, lambda new, old: new >= old, executor, batch)
+                volume=packed_items[0]
+                cost=packed_items[3]
+            elif search=="adaptive":
+                packed_items=adaptive_window(session, sorted_economy_items, packed_items, lambda new, old: new >= old, 0.80*current_bin_volume)
+                volume=packed_items[0]
+                cost=packed_items[3]
+            while (not batch and search=="tcp" and volume<0.80*current_bin_volume and cwnd<len(sorted_economy_items)):
                 # STILL VOLUME IS LEFT IN THE BOX
                 cwnd = cwnd * 2
                 last_items = sorted_economy_items[-cwnd:]
 
-                item_list.extend(last_items)
-                new_packing = pack_items([0, item_list], uld_list[current_bin], is_stable) 
-                print(item_list)
+                new_packing = session.try_extend(last_items)
 
 
                 new_volume = new_packing[0]
                 new_cost=new_packing[3]
 
                 if new_cost >= cost:
+                    session.commit()
                     packed_items = new_packing
                     volume = new_volume
                     cost=new_cost
                 else:
+                    session.rollback()
                     break
 
-                for item in last_items:
-                    item_list.remove(item) 
-
 
             window_size = 0
             ack_count=0
-            item_list=[]
-            for item in packed_items[1]:
-                item_list.append(item)
 
             packed_ids = {item[0] for item in packed_items[1]}
             prev_temp=prev_sorted
             prev_sorted = [item for item in prev_sorted if item[0] not in packed_ids]
 
+            if batch:
+                packed_items=speculative_ack(session, prev_sorted, packed_items, lambda new, old: new > old, executor, batch)
+                volume=packed_items[0]
+                cost=packed_items[3]
+            elif search=="adaptive":
+                packed_items=adaptive_window(session, prev_sorted, packed_items, lambda new, old: new > old)
+                volume=packed_items[0]
+                cost=packed_items[3]
 
-            while (ack_count<5):
+            while (not batch and search=="tcp" and ack_count<5):
                 window_size+=1
                 last_items = prev_sorted[-window_size:]
-                item_list.extend(last_items)
-                new_packing = pack_items([0, item_list], uld_list[current_bin], is_stable)
+                new_packing = session.try_extend(last_items)
                 new_volume = new_packing[0]
                 new_cost=new_packing[3]
                 if new_cost > cost:
+                    session.commit()
                     packed_items = new_packing
                     volume = new_volume
                     cost=new_cost
                     ack_count=0
                 else:
+                    session.rollback()
                     ack_count+=1
-                for item in last_items:
-                    item_list.remove(item)  
 
             packed_ids={item[0] for item in packed_items[1]}
             prev_temp = [item for item in prev_temp if item[0] not in packed_ids]
@@ -587,134 +801,34 @@ def main():
     
     
     print("Simulated Annealing Phase")
-    total_packed_cost=0
-    for key in bin_cost:
-        total_packed_cost+=bin_cost[key]
     initial_temp=10000
     final_temp=0.001
     cooling_rate=0.975
-    temperature=initial_temp
-    curr_cost=total_packed_cost
-    MAX_EXPONENT = -700
     pprint.pprint(packed_data)
 
     print("sorted economy items")
 
     print(len(sorted_economy_items))
     
-    cost_arr=[curr_cost]
-    while (temperature > final_temp and sorted_economy_items):
-        element=random.choice(sorted_economy_items)
-        print("***********************Selected ELement*********************************")
-        print(element)
-        new_packing=[]
-        flag=False
-        best_bin=5
-        new_total_cost=0
-        best_till_now=0
-        for j in range(len(uld_list)):
-            current_bin=j
-            total_items=[]
-            for item in packed_data[current_bin]:
-                it=item[0]
-                data=[it,data_map[it][0],data_map[it][1],data_map[it][2],data_map[it][3],data_map[it][4],data_map[it][5]]
-                total_items.append(data)
-            total_items.append(element)
-
-
-            packed_items=pack_items([0,total_items],uld_list[current_bin], is_stable)
-            new_cost=packed_items[3]
-            
-            modified_data = [
-                [item1[0], item1[5], item2[0], item2[1], item2[2], item2[3], item2[4], item2[5] ]
-                for item1, item2 in zip(packed_items[1], packed_items[2]) 
-            ]
-            
-            pprint.pprint(modified_data)
-
-            if (best_till_now < new_cost):
-                best_bin=current_bin
-                best_till_now=new_cost
-                new_packing=modified_data
-
-        new_total_cost=curr_cost-bin_cost[best_bin]+best_till_now
-
-        cost_arr.append(new_total_cost)
-
-        if (new_total_cost>curr_cost):
-            #ACCEPT THE SOLUTION 
-            print("**************************************************Got a better pick*****************************************")
-
-            previously_packed_ids=[]
-            for items in packed_data[best_bin]:
-                previously_packed_ids.append(items[0])
-            newly_packed_ids=[]
-            for items in new_packing:
-                newly_packed_ids.append(items[0])
-            dropout=[]
-            for items in previously_packed_ids:
-                if items not in newly_packed_ids:
-                    dropout.append([items,data_map[items][0],data_map[items][1],data_map[items][2],data_map[items][3],data_map[items][4],data_map[items][5]])
-            packed_data[best_bin]=new_packing
-            bin_cost[best_bin]=best_till_now
-            if (element[0] in newly_packed_ids):
-                sorted_economy_items.remove(element)
-            sorted_economy_items.extend(dropout)
-            tot=0
-            for key in packed_data:
-                tot+=len(packed_data[key])
-            packed=tot
-            tot+=len(sorted_economy_items)
-            unpacked=tot-packed
-            if (tot!=400):
-                print("Termination")
-                print("***************Unequal number of elements*********************")
-                print("Packed Items",packed)
-                print("Unpacked Items",unpacked)
-                print("Current iteration for element:-",element)
-                print("Currently in bin no ",best_bin)
-                print("Previously packed".previously_packed_ids)
-                print([items[0] for items in dropout])
-                print([items[0] for items in packed_data[best_bin]])
-                break
-            curr_cost=new_total_cost
-
-        
-        
-        elif (random.random() < math.exp(max((new_total_cost-curr_cost),MAX_EXPONENT) / temperature) and abs(curr_cost-new_total_cost)<10**4):
-            #ACCEPT THE SOLUTION
-            previously_packed_ids=[]
-            for items in packed_data[best_bin]:
-                previously_packed_ids.append(items[0])
-            newly_packed_ids=[]
-            for items in new_packing:
-                newly_packed_ids.append(items[0])
-            dropout=[]
-            for items in previously_packed_ids:
-                if items not in newly_packed_ids:
-                    dropout.append([items,data_map[items][0],data_map[items][1],data_map[items][2],data_map[items][3],data_map[items][4],data_map[items][5]])
-            packed_data[best_bin]=new_packing
-            bin_cost[best_bin]=best_till_now
-            if (element[0] in newly_packed_ids):
-                sorted_economy_items.remove(element)
-            sorted_economy_items.extend(dropout)
-            curr_cost=new_total_cost
-            tot=0
-            for key in packed_data:
-                tot+=len(packed_data[key])
-            tot+=len(sorted_economy_items)
-            if (tot!=400):
-                print("Termination")
-                print("***************Unequal number of elements*********************")
-                print("Packed Items",packed)
-                print("Unpacked Items",unpacked)
-                print("Current iteration for element:-",element)
-                print("Currently in bin no ",best_bin)
-                print("Previously packed",previously_packed_ids)
-                print([items[0] for items in dropout])
-                print([items[0] for items in packed_data[best_bin]])
-                break
-        temperature *= cooling_rate
+    parcels={key: tuple([key]+data_map[key]) for key in data_map}
+    if args.moves=="mixed":
+        # Swaps and removals besides inserts, stopping after 200 steps without a new best
+        annealer=Annealer(uld_list, parcels, is_stable,
+                          moves=[(InsertMove(),6),(SwapMove(),3),(RemoveMove(),1)],
+                          initial_temp=initial_temp, final_temp=final_temp, cooling_rate=cooling_rate, patience=200)
+    else:
+        annealer=Annealer(uld_list, parcels, is_stable,
+                          initial_temp=initial_temp, final_temp=final_temp, cooling_rate=cooling_rate)
+    state=AnnealingState({j: packed_data.get(j, []) for j in range(len(uld_list))}, {j: bin_cost.get(j, 0) for j in range(len(uld_list))}, sorted_economy_items)
+    if chains > 1:
+        state, cost_arr=annealer.temper(state, chains=chains, executor=executor)
+    else:
+        state, cost_arr=annealer.run(state, random, executor)
+    packed_data={j: rows for j, rows in state.packed_data.items() if rows}
+    bin_cost=state.bin_cost
+    sorted_economy_items=state.unpacked
+    if executor is not None:
+        executor.shutdown()
     
     
     
@@ -749,6 +863,11 @@ def main():
     print(cost)
     print("**************************************Processing Complete**************************************")
     print("Total Cost incurred:",incurred_cost)
+    print("Pack cache:",pack_cache.stats())
+    print("Pack filter:",window_filter.stats())
+    if solve_cache is not None:
+        print("Solve cache:",solve_cache.stats())
+        solve_cache.close()
     print ("Output saved to packed_item.csv")
 
     end_time = time.time()
@@ -0,0 +1,82 @@
+from runner import PackingSession
+
+
+def fits_box(item, box):
+    # Some orientation of the parcel fits the empty ULD
+    return all(a <= b for a, b in zip(sorted(item[1:4]), sorted(box)))
+
+
+def greedy_fill(items, uld, is_stable=False):
+    # Add parcels in the given order, each one is kept only if py3dbp can place it
+    session = PackingSession([0, []], uld, is_stable)
+    box_volume = uld[1] * uld[2] * uld[3]
+    volume = weight = 0
+    smallest = min((item[1] * item[2] * item[3] for item in items), default=0)
+    for item in items:
+        if box_volume - volume < smallest:
+            break
+        item_volume = item[1] * item[2] * item[3]
+        if volume + item_volume > box_volume or weight + item[4] > uld[4]:
+            continue
+        result = session.try_extend([item])
+        if any(fitted[0] == str(item[0]) for fitted in result[1]):
+            session.commit()
+            volume += item_volume
+            weight += item[4]
+            continue
+        session.rollback()
+        if is_stable:
+            # Stable placements depend on the order, repack the selection from scratch as the controller will
+            selection = list(session.result[1]) + [item]
+            repacked = PackingSession([0, selection], uld, is_stable)
+            if len(repacked.result[1]) == len(selection):
+                session = repacked
+                volume += item_volume
+                weight += item[4]
+    placed = {fitted[0] for fitted in session.result[1]}
+    return [item for item in items if str(item[0]) in placed]
+
+
+def preselect(items, box_length, box_width, box_height, box_weight_limit, value=None, orderings=3, is_stable=False):
+    '''
+    Gurobi-free stand-in for solve_packing / solve_economy_packing. Parcels
+    are added greedily with a py3dbp placement check, once for each of the
+    first `orderings` of the three orderings (value density, value, density
+    against volume and weight). The fill with the highest total value wins. value(item) defaults
+    to the parcel cost. Returns [volume, packed_items, cost] like the
+    MILP solvers.
+    '''
+    value = value or (lambda item: item[6])
+    box = (box_length, box_width, box_height)
+    box_volume = box_length * box_width * box_height
+    items = [item for item in items if fits_box(item, box) and item[4] <= box_weight_limit]
+    volume_of = lambda item: item[1] * item[2] * item[3]
+    orders = [
+        lambda item: value(item) / volume_of(item),
+        lambda item: value(item),
+        lambda item: value(item) / (volume_of(item) / box_volume + item[4] / box_weight_limit),
+    ]
+    if not 1 <= orderings <= len(orders):
+        raise ValueError('orderings must be between 1 and {}'.format(len(orders)))
+    uld = ['preselect', box_length, box_width, box_height, box_weight_limit]
+
+    best = []
+    for order in orders[:orderings]:
+        packed = greedy_fill(sorted(items, key=order, reverse=True), uld, is_stable)
+        if sum(value(item) for item in packed) > sum(value(item) for item in best):
+            best = packed
+
+    packed_items = [tuple(item[:7]) for item in best]
+    total_volume = sum(volume_of(item) for item in packed_items)
+    cost = sum(item[6] for item in packed_items)
+    return [total_volume, packed_items, cost]
+
+
+def preselect_packing(items, box_length, box_width, box_height, box_weight_limit, is_stable=False):
+    # solve_packing counterpart, as many priority parcels as possible
+    return preselect(items, box_length, box_width, box_height, box_weight_limit, value=lambda item: 1, is_stable=is_stable)
+
+
+def preselect_economy_packing(items, box_length, box_width, box_height, box_weight_limit, is_stable=False):
+    # solve_economy_packing counterpart, highest total cost
+    return preselect(items, box_length, box_width, box_height, box_weight_limit, is_stable=is_stable)
@@ -1 +1,3 @@
-from .main import Packer, Bin, Item, Painter
+from .main import Packer, Bin, Item, Placement, Painter
+from .broad_phase import BroadPhase, BruteForce, UniformGrid
+from .item_table import ItemTable
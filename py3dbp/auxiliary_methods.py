@@ -1,4 +1,5 @@
 from decimal import Decimal
+import numpy as np
 from .constants import RotationType, Axis
 
 def rectIntersect(item1, item2, x, y):
@@ -24,6 +25,22 @@ def intersect(item1, item2):
     )
 
 
+def fitMask(lo, hi, boxes, limit):
+    ''' 
+    Batched putItem feasibility for p pivots x r rotations.
+    lo : (p,3) pivots, hi : (p,r,3) far corner per rotation,
+    boxes : (n,6) placed boxes as x0,x1,y0,y1,z0,z1, limit : bin (W,H,D).
+    Returns boolean (p,r) arrays inside and clear, clear meaning no placed box
+    overlaps with positive volume, the same test as intersect().
+    '''
+    inside = np.all(hi <= np.asarray(limit, dtype=float), axis=2)
+    overlap = np.ones(hi.shape[:2] + (len(boxes),), dtype=bool)
+    for axis in Axis.ALL:
+        overlap &= boxes[:, 2*axis] < hi[:, :, axis, None]
+        overlap &= lo[:, axis, None, None] < boxes[:, 2*axis+1]
+    return inside, ~overlap.any(axis=2)
+
+
 def getLimitNumberOfDecimals(number_of_decimals):
     return Decimal('1.{}'.format('0' * number_of_decimals))
 
@@ -32,3 +49,13 @@ def set2Decimal(value, number_of_decimals=0):
     number_of_decimals = getLimitNumberOfDecimals(number_of_decimals)
 
     return Decimal(value).quantize(number_of_decimals)
+
+
+def set2Scaled(value, number_of_decimals=0):
+    ''' value as an integer count of 10**-number_of_decimals units '''
+    return int(set2Decimal(value, number_of_decimals).scaleb(number_of_decimals))
+
+
+def scaled2Decimal(value, number_of_decimals=0):
+    ''' inverse of set2Scaled '''
+    return set2Decimal(Decimal(value).scaleb(-number_of_decimals), number_of_decimals)
@@ -0,0 +1,109 @@
+import numpy as np
+from .auxiliary_methods import scaled2Decimal, set2Scaled
+from .constants import Axis
+
+
+class ExtremePoints:
+    ''' 
+    Candidate pivots for Packer.pack2Bin. Placing a box adds its three corner
+    points (position + dimension along each axis); points that end up inside a
+    placed box or on/over the far bin walls can never hold an item and are dropped.
+    Points are kept per axis in placement order, the order pack2Bin used to scan.
+    With prune set, candidates() leaves out points dominated by another
+    candidate, one at or below it on all three axes. pack2Bin then tries the
+    dominated points only for items none of the others holds, placements
+    differ from the unpruned scan so it is off by default.
+    '''
+
+    def __init__(self, prune=False):
+        self.prune = prune
+        self.limit = np.zeros(3)
+        self.points = [[], [], []]
+        self.coords = [np.empty((0, 3)) for axis in Axis.ALL]
+
+
+    def reset(self, bin):
+        ''' drop every point, called by Bin.clearBin '''
+        self.limit = np.array([float(bin.width), float(bin.height), float(bin.depth)])
+        self.points = [[], [], []]
+        self.coords = [np.empty((0, 3)) for axis in Axis.ALL]
+
+
+    def _free(self, coords, boxes):
+        ''' rows of coords inside the bin and not covered by any of boxes '''
+        covered = np.ones((len(coords), len(boxes)), dtype=bool)
+        for axis in Axis.ALL:
+            covered &= (boxes[:, 2*axis] <= coords[:, axis, None]) & (coords[:, axis, None] < boxes[:, 2*axis+1])
+        return np.all(coords < self.limit, axis=1) & ~covered.any(axis=1)
+
+
+    def add(self, position, dimension, box, boxes):
+        ''' 
+        register a placed box, box is its x0,x1,y0,y1,z0,z1 row and boxes
+        every placed box including it
+        '''
+        box = np.asarray(box[:6])[None, :]
+        for axis in Axis.ALL:
+            if len(self.points[axis]):
+                keep = self._free(self.coords[axis], box)
+                self.points[axis] = [p for p, k in zip(self.points[axis], keep) if k]
+                self.coords[axis] = self.coords[axis][keep]
+            point = [position[0], position[1], position[2]]
+            point[axis] = position[axis] + dimension[axis]
+            coords = np.array([[float(i) for i in point]])
+            if self._free(coords, boxes[:, :6])[0]:
+                self.points[axis].append(point)
+                self.coords[axis] = np.append(self.coords[axis], coords, axis=0)
+
+
+    def candidates(self, prune=None):
+        ''' (pivot, axis) pairs in scan order, repeated points only once, prune overrides self.prune '''
+        seen = set()
+        result = []
+        rows = []
+        for axis in Axis.ALL:
+            for point, row in zip(self.points[axis], self.coords[axis]):
+                key = tuple(point)
+                if key not in seen:
+                    seen.add(key)
+                    result.append((point, axis))
+                    rows.append(row)
+        if (self.prune if prune is None else prune) and len(result) > 1:
+            # below[q, p] : q is at or below p on every axis, points are distinct so q dominates p
+            coords = np.array(rows)
+            below = np.all(coords[:, None, :] <= coords[None, :, :], axis=2)
+            np.fill_diagonal(below, False)
+            result = [pair for pair, dominated in zip(result, below.any(axis=0)) if not dominated]
+        return result
+
+
+    def __len__(self):
+        return sum(len(points) for points in self.points)
+
+
+    def unscale(self, bin):
+        ''' follow Bin.unscaleNumbers '''
+        n = bin.number_of_decimals
+        self.limit = np.array([float(bin.width), float(bin.height), float(bin.depth)])
+        for axis in Axis.ALL:
+            self.points[axis] = [[scaled2Decimal(i, n) for i in p] for p in self.points[axis]]
+            self.coords[axis] = self.coords[axis] / 10 ** n
+
+
+    def scale(self, bin):
+        ''' follow Bin.scaleNumbers '''
+        n = bin.number_of_decimals
+        self.limit = np.array([float(bin.width), float(bin.height), float(bin.depth)])
+        for axis in Axis.ALL:
+            self.points[axis] = [[set2Scaled(i, n) for i in p] for p in self.points[axis]]
+            self.coords[axis] = np.round(self.coords[axis] * 10 ** n)
+
+
+    def snapshot(self):
+        return ([list(p) for p in self.points], list(self.coords), self.limit)
+
+
+    def restore(self, snapshot):
+        points, coords, self.limit = snapshot
+        self.points = [list(p) for p in points]
+        self.coords = list(coords)
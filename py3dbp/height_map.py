@@ -0,0 +1,104 @@
+import math
+import numpy as np
+from .constants import RotationType
+
+
+class HeightMap:
+    ''' 
+    2.5D placement engine, see Packer.pack2HeightMap.
+    The bin floor (width x height) is a grid of top depths with `resolution`
+    units per cell. An item is dropped onto the highest cell under its
+    footprint, so placement, support and stability are slices of the grid.
+    Meant for floor-stacked loads : space left under an overhang is lost.
+    '''
+
+    def __init__(self, bin, resolution=1):
+        self.resolution = resolution
+        self.reset(bin)
+
+
+    def reset(self, bin):
+        ''' empty grid for bin, called by Bin.clearBin '''
+        # cell size in the bin's own units, scaled bins count in 10**-n
+        self.cell = float(self.resolution) * (10 ** bin.number_of_decimals if bin.scaled else 1)
+        self.tops = np.zeros((int(float(bin.width) // self.cell), int(float(bin.height) // self.cell)))
+        self.depth = float(bin.depth)
+        # lower-left footprint corners to try, in cells
+        self.corners = {(0, 0)}
+
+
+    def unscale(self, bin):
+        ''' follow Bin.unscaleNumbers '''
+        self.tops /= 10 ** bin.number_of_decimals
+        self.cell = float(self.resolution)
+        self.depth = float(bin.depth)
+
+
+    def scale(self, bin):
+        ''' follow Bin.scaleNumbers '''
+        self.tops = np.round(self.tops * 10 ** bin.number_of_decimals)
+        self.cell = float(self.resolution) * 10 ** bin.number_of_decimals
+        self.depth = float(bin.depth)
+
+
+    def snapshot(self):
+        return (self.tops.copy(), set(self.corners), self.cell, self.depth, self.resolution)
+
+
+    def restore(self, snapshot):
+        tops, corners, self.cell, self.depth, self.resolution = snapshot
+        self.tops = tops.copy()
+        self.corners = set(corners)
+
+
+    def footprint(self, dimension):
+        ''' cells covered along width and height '''
+        return math.ceil(float(dimension[0]) / self.cell), math.ceil(float(dimension[1]) / self.cell)
+
+
+    def isStable(self, region, z, support_surface_ratio):
+        ''' check_stable rules on cells : support ratio, else all four corners supported '''
+        support = region == z
+        if support.mean() >= support_surface_ratio:
+            return True
+        return bool(support[0,0] and support[-1,0] and support[0,-1] and support[-1,-1])
+
+
+    def findPosition(self, item, check_stable=False, support_surface_ratio=0):
+        ''' lowest, then left-most (z, x, y) spot over every allowed rotation, None if nothing fits '''
+        rotate = RotationType.ALL if item.updown == True else RotationType.Notupdown
+        best = None
+        for rotation, dimension in zip(rotate, item.getDimensions(rotate)):
+            fw, fh = self.footprint(dimension)
+            d = float(dimension[2])
+            for cx, cy in self.corners:
+                if cx + fw > self.tops.shape[0] or cy + fh > self.tops.shape[1]:
+                    continue
+                region = self.tops[cx:cx+fw, cy:cy+fh]
+                z = region.max()
+                if z + d > self.depth:
+                    continue
+                if best is not None and (z, cx, cy) >= best[:3]:
+                    continue
+                if check_stable and not self.isStable(region, z, support_surface_ratio):
+                    continue
+                best = (z, cx, cy, rotation, fw, fh, d)
+        return best
+
+
+    def place(self, z, cx, cy, fw, fh, d):
+        ''' raise the footprint to the item top and add its corners as candidates '''
+        self.tops[cx:cx+fw, cy:cy+fh] = z + d
+        self.corners.add((cx + fw, cy))
+        self.corners.add((cx, cy + fh))
+
+
+    def addBox(self, box):
+        ''' raise every cell a x0,x1,y0,y1,z0,z1 box touches to at least its top '''
+        cx, cy = int(box[0] // self.cell), int(box[2] // self.cell)
+        fw = math.ceil(box[1] / self.cell) - cx
+        fh = math.ceil(box[3] / self.cell) - cy
+        region = self.tops[cx:cx+fw, cy:cy+fh]
+        region[...] = np.maximum(region, box[5])
+        self.corners.add((cx + fw, cy))
+        self.corners.add((cx, cy + fh))
@@ -0,0 +1,73 @@
+from .auxiliary_methods import set2Scaled
+from .main import Item
+import math
+import numpy as np
+
+
+class ItemTable:
+    ''' 
+    Parcels converted once for many packing jobs. Numbers are scaled
+    integers in a (n, 4) array of width, height, depth, weight, and every
+    row gets a rank in Packer.pack order. items() builds the Item objects of
+    one job already scaled and sorted, to be packed with presorted=True.
+    Items of one job share level and loadbear, so the rank only depends on
+    the dimensions.
+    '''
+
+    def __init__(self, rows, number_of_decimals=0, updown=True):
+        ''' rows : (partno, width, height, depth, weight, typeof, cost) '''
+        self.number_of_decimals = number_of_decimals
+        self.index = {}
+        self.partno = []
+        self.typeof = []
+        self.cost = []
+        self.updown = []
+        numbers = []
+        for row in rows:
+            row = tuple(row)
+            if row in self.index:
+                continue
+            self.index[row] = len(self.partno)
+            self.partno.append(str(row[0]))
+            self.typeof.append(row[5])
+            self.cost.append(row[6])
+            self.updown.append(updown if row[5] == 'cube' else False)
+            numbers.append([set2Scaled(value, number_of_decimals) for value in row[1:5]])
+        self.numbers = np.array(numbers, dtype=np.int64).reshape(-1, 4)
+        self.rank = self.rankRows()
+
+
+    def __len__(self):
+        return len(self.partno)
+
+
+    def rankRows(self):
+        ''' position of every row in the Packer.pack sort, equal keys share a rank '''
+        keys = []
+        for (w, h, d, _), updown in zip(self.numbers.tolist(), self.updown):
+            a = sorted([w, h, d], reverse=True) if updown else [w, h, d]
+            keys.append((w * h * d, (w + h + d) / 3, math.sqrt(w**2 + h**2 + d**2), a[0] * a[1]))
+        distinct = sorted(set(keys), reverse=True)
+        order = {key: rank for rank, key in enumerate(distinct)}
+        return [order[key] for key in keys]
+
+
+    def lookup(self, rows):
+        ''' row indices of parcels given as in __init__ '''
+        return [self.index[tuple(row)] for row in rows]
+
+
+    def items(self, indices, level=1, loadbear=0, color='Yellow'):
+        ''' scaled Items for the rows in indices, in packing order '''
+        items = []
+        for i in sorted(indices, key=lambda i: self.rank[i]):
+            w, h, d, weight = self.numbers[i].tolist()
+            item = Item(
+                partno=self.partno[i], name='item_{}'.format(self.partno[i]), typeof=self.typeof[i],
+                WHD=(w, h, d), weight=weight, level=level, loadbear=loadbear,
+                updown=self.updown[i], color=color, cost=self.cost[i]
+            )
+            item.number_of_decimals = self.number_of_decimals
+            item.scaled = True
+            items.append(item)
+        return items
@@ -1,18 +1,28 @@
 from .constants import RotationType, Axis
 import math
-from .auxiliary_methods import intersect, set2Decimal
+from decimal import Decimal
+from .auxiliary_methods import fitMask, set2Decimal, set2Scaled, scaled2Decimal
+from .broad_phase import BruteForce
+from .extreme_points import ExtremePoints
+from .placement_buffer import PlacementBuffer
+from .stability import SupportSurfaces
+from .height_map import HeightMap
 import numpy as np  # required to plot a representation of Bin and contained items
 from matplotlib.patches import Rectangle, Circle
 import matplotlib.pyplot as plt
 import mpl_toolkits.mplot3d.art3d as art3d
-from collections import Counter
-import copy
+from collections import Counter, namedtuple
 
 DEFAULT_NUMBER_OF_DECIMALS = 0
 START_POSITION = [0, 0, 0]
 
 class Item:
 
+    __slots__ = (
+        'partno', 'name', 'typeof', 'width', 'height', 'depth', 'weight', 'level', 'loadbear',
+        'updown', 'color', 'rotation_type', 'position', 'number_of_decimals', 'scaled', 'cost'
+    )
+
     def __init__(self, partno,name,typeof, WHD, weight, level, loadbear, updown, color,cost):
         ''' '''
         self.partno = partno
@@ -33,6 +43,8 @@ class Item:
         self.rotation_type = 0
         self.position = START_POSITION
         self.number_of_decimals = DEFAULT_NUMBER_OF_DECIMALS
+        # True while numbers are held as integers in 10**-number_of_decimals units
+        self.scaled = False
         self.cost=cost
 
 
@@ -45,6 +57,32 @@ class Item:
         self.number_of_decimals = number_of_decimals
 
 
+    def scaleNumbers(self, number_of_decimals):
+        ''' integer counterpart of formatNumbers '''
+        if self.scaled:
+            return
+        self.width = set2Scaled(self.width, number_of_decimals)
+        self.height = set2Scaled(self.height, number_of_decimals)
+        self.depth = set2Scaled(self.depth, number_of_decimals)
+        self.weight = set2Scaled(self.weight, number_of_decimals)
+        self.position = [set2Scaled(i, number_of_decimals) for i in self.position]
+        self.number_of_decimals = number_of_decimals
+        self.scaled = True
+
+
+    def unscaleNumbers(self):
+        ''' convert scaled integers back to the Decimals formatNumbers produces '''
+        if not self.scaled:
+            return
+        n = self.number_of_decimals
+        self.width = scaled2Decimal(self.width, n)
+        self.height = scaled2Decimal(self.height, n)
+        self.depth = scaled2Decimal(self.depth, n)
+        self.weight = scaled2Decimal(self.weight, n)
+        self.position = [scaled2Decimal(i, n) for i in self.position]
+        self.scaled = False
+
+
     def string(self):
         ''' '''
         return "%s(%sx%sx%s, weight: %s) pos(%s) rt(%s) vol(%s)" % (
@@ -55,6 +93,8 @@ class Item:
 
     def getVolume(self):
         ''' '''
+        if self.scaled:
+            return self.width * self.height * self.depth
         return set2Decimal(self.width * self.height * self.depth, self.number_of_decimals)
 
 
@@ -62,34 +102,81 @@ class Item:
         ''' '''
         a = sorted([self.width,self.height,self.depth],reverse=True) if self.updown == True else [self.width,self.height,self.depth]
     
+        if self.scaled:
+            return a[0] * a[1]
         return set2Decimal(a[0] * a[1] , self.number_of_decimals)
 
 
-    def getDimension(self):
-        ''' rotation type '''
-        if self.rotation_type == RotationType.RT_WHD:
+    def getDimension(self, rotation_type=None):
+        ''' rotation type, defaults to self.rotation_type '''
+        if rotation_type is None:
+            rotation_type = self.rotation_type
+        if rotation_type == RotationType.RT_WHD:
             dimension = [self.width, self.height, self.depth]
-        elif self.rotation_type == RotationType.RT_HWD:
+        elif rotation_type == RotationType.RT_HWD:
             dimension = [self.height, self.width, self.depth]
-        elif self.rotation_type == RotationType.RT_HDW:
+        elif rotation_type == RotationType.RT_HDW:
             dimension = [self.height, self.depth, self.width]
-        elif self.rotation_type == RotationType.RT_DHW:
+        elif rotation_type == RotationType.RT_DHW:
             dimension = [self.depth, self.height, self.width]
-        elif self.rotation_type == RotationType.RT_DWH:
+        elif rotation_type == RotationType.RT_DWH:
             dimension = [self.depth, self.width, self.height]
-        elif self.rotation_type == RotationType.RT_WDH:
+        elif rotation_type == RotationType.RT_WDH:
             dimension = [self.width, self.depth, self.height]
         else:
             dimension = []
 
         return dimension
 
+
+    def getDimensions(self, rotations):
+        ''' getDimension for every rotation type in rotations '''
+        return [self.getDimension(i) for i in rotations]
+
+
+
+class Placement(namedtuple('Placement', ['item', 'position', 'rotation_type'])):
+    ''' 
+    Immutable record of an item placed in a bin, what Bin.items holds.
+    Other attributes (partno, width, cost ...) are read from the item.
+    '''
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        return getattr(self.item, name)
+
+
+    def getDimension(self):
+        ''' dimension in the placed rotation '''
+        return self.item.getDimension(self.rotation_type)
+
+
+    def string(self):
+        ''' '''
+        return "%s(%sx%sx%s, weight: %s) pos(%s) rt(%s) vol(%s)" % (
+            self.partno, self.width, self.height, self.depth, self.weight,
+            self.position, self.rotation_type, self.getVolume()
+        )
+
+
+    def scaleNumbers(self, number_of_decimals):
+        ''' Placement with a scaled position, the item is converted in place '''
+        self.item.scaleNumbers(number_of_decimals)
+        return self._replace(position=tuple(set2Scaled(i, number_of_decimals) for i in self.position))
+
+
+    def unscaleNumbers(self, number_of_decimals):
+        ''' Placement with a Decimal position, the item is converted in place '''
+        self.item.unscaleNumbers()
+        return self._replace(position=tuple(scaled2Decimal(i, number_of_decimals) for i in self.position))
+
     
 
 class Bin:
 
-    def __init__(self, partno, WHD, max_weight,corner=0,put_type=1):
-        ''' '''
+    def __init__(self, partno, WHD, max_weight,corner=0,put_type=1,broad_phase=None):
+        ''' broad_phase : collision candidate index, see broad_phase.py '''
         self.partno = partno
         self.width = WHD[0]
         self.height = WHD[1]
@@ -97,15 +184,46 @@ class Bin:
         self.max_weight = max_weight
         self.corner = corner
         self.items = []
-        self.fit_items = np.array([[0,WHD[0],0,WHD[1],0,0]])
+        # snapped boxes as x0,x1,y0,y1,z0,z1, row 0 is the bin floor
+        self.fit_buffer = PlacementBuffer(6)
+        # top faces of fit_items by height, for check_stable
+        self.support = SupportSurfaces()
+        self.addFitItem([0,WHD[0],0,WHD[1],0,0])
+        # placed item boxes as x0,x1,y0,y1,z0,z1,weight in self.items order, see fitMask
+        self.box_buffer = PlacementBuffer(7)
+        # running totals of the packed items, kept by addBox and clearBin
+        self.item_count = 0
+        self.total_weight = 0
+        self.total_volume = 0
+        self.total_cost = 0
         self.unfitted_items = []
         self.number_of_decimals = DEFAULT_NUMBER_OF_DECIMALS
+        self.scaled = False
         self.fix_point = False
         self.check_stable = False
         self.support_surface_ratio = 0
         self.put_type = put_type
         # used to put gravity distribution
         self.gravity = []
+        self.broad_phase = broad_phase if broad_phase is not None else BruteForce()
+        self.broad_phase.reset(self)
+        # candidate pivots for pack2Bin
+        self.extreme_points = ExtremePoints()
+        self.extreme_points.reset(self)
+        # floor grid of the height-map engine, created by Packer.pack2HeightMap
+        self.height_map = None
+
+
+    @property
+    def fit_items(self):
+        ''' live rows of fit_buffer '''
+        return self.fit_buffer.rows
+
+
+    @property
+    def boxes(self):
+        ''' live rows of box_buffer '''
+        return self.box_buffer.rows
 
 
     def formatNumbers(self, number_of_decimals):
@@ -117,6 +235,100 @@ class Bin:
         self.number_of_decimals = number_of_decimals
 
 
+    def scaleNumbers(self, number_of_decimals):
+        ''' integer counterpart of formatNumbers, items already packed are converted too '''
+        if self.scaled:
+            return
+        n = number_of_decimals
+        self.width = set2Scaled(self.width, n)
+        self.height = set2Scaled(self.height, n)
+        self.depth = set2Scaled(self.depth, n)
+        self.max_weight = set2Scaled(self.max_weight, n)
+        self.corner = set2Scaled(self.corner, n)
+        self.number_of_decimals = n
+        self.scaled = True
+        self.items = [placement.scaleNumbers(n) for placement in self.items]
+        self.total_weight = set2Scaled(self.total_weight, n)
+        self.total_volume = int(Decimal(self.total_volume).scaleb(3 * n))
+        self.fit_items[:] = np.round(self.fit_items * 10 ** n)
+        self.boxes[:] = np.round(self.boxes * 10 ** n)
+        self.reindex()
+        self.extreme_points.scale(self)
+        if self.height_map is not None:
+            self.height_map.scale(self)
+
+
+    def unscaleNumbers(self):
+        ''' convert bin and packed items back to Decimals, placements are kept '''
+        if not self.scaled:
+            return
+        n = self.number_of_decimals
+        self.width = scaled2Decimal(self.width, n)
+        self.height = scaled2Decimal(self.height, n)
+        self.depth = scaled2Decimal(self.depth, n)
+        self.max_weight = scaled2Decimal(self.max_weight, n)
+        self.corner = scaled2Decimal(self.corner, n)
+        self.items = [placement.unscaleNumbers(n) for placement in self.items]
+        for item in self.unfitted_items:
+            item.unscaleNumbers()
+        self.total_weight = scaled2Decimal(self.total_weight, n)
+        self.total_volume = Decimal(self.total_volume).scaleb(-3 * n)
+        self.fit_items[:] /= 10 ** n
+        self.boxes[:] /= 10 ** n
+        self.reindex()
+        self.extreme_points.unscale(self)
+        if self.height_map is not None:
+            self.height_map.unscale(self)
+        self.scaled = False
+
+
+    def reindex(self):
+        ''' rebuild the support surfaces and broad phase from fit_items and boxes '''
+        self.support.clear()
+        for box in self.fit_items:
+            self.support.add(box)
+        self.broad_phase.reset(self)
+        for index, box in enumerate(self.boxes):
+            self.broad_phase.insert(index, box)
+
+
+    def snapshot(self):
+        ''' 
+        Cheap copy of the packing state for restore(). Placing items only
+        appends, so buffers are saved by length and lists by reference copy.
+        '''
+        return {
+            'items': list(self.items),
+            'unfitted_items': list(self.unfitted_items),
+            'fit_items': len(self.fit_buffer),
+            'boxes': len(self.box_buffer),
+            'totals': (self.item_count, self.total_weight, self.total_volume, self.total_cost),
+            'extreme_points': self.extreme_points.snapshot(),
+            'height_map': self.height_map.snapshot() if self.height_map is not None else None,
+            'scaled': self.scaled,
+        }
+
+
+    def restore(self, snapshot):
+        ''' go back to a snapshot() taken in the same number mode '''
+        if snapshot['scaled'] != self.scaled:
+            raise ValueError('snapshot was taken with scaled={}'.format(snapshot['scaled']))
+        self.items = list(snapshot['items'])
+        self.unfitted_items = list(snapshot['unfitted_items'])
+        self.fit_buffer.size = snapshot['fit_items']
+        self.box_buffer.size = snapshot['boxes']
+        (self.item_count, self.total_weight, self.total_volume, self.total_cost) = snapshot['totals']
+        self.reindex()
+        self.extreme_points.restore(snapshot['extreme_points'])
+        if snapshot['height_map'] is None:
+            self.height_map = None
+        else:
+            if self.height_map is None:
+                # the bin left the height-map engine after the snapshot, the grid is rebuilt from it
+                self.height_map = HeightMap(self)
+            self.height_map.restore(snapshot['height_map'])
+
+
     def string(self):
         ''' '''
         return "%s(%sx%sx%s, max_weight:%s) vol(%s)" % (
@@ -127,6 +339,8 @@ class Bin:
 
     def getVolume(self):
         ''' '''
+        if self.scaled:
+            return self.width * self.height * self.depth
         return set2Decimal(
             self.width * self.height * self.depth, self.number_of_decimals
         )
@@ -134,44 +348,66 @@ class Bin:
 
     def getTotalWeight(self):
         ''' '''
-        total_weight = 0
+        if self.scaled:
+            return self.total_weight
+        return set2Decimal(self.total_weight, self.number_of_decimals)
+
+
+    def unit(self):
+        ''' size of a whole unit in the numbers this bin currently uses '''
+        return 10 ** self.number_of_decimals if self.scaled else 1
 
-        for item in self.items:
-            total_weight += item.weight
 
-        return set2Decimal(total_weight, self.number_of_decimals)
+    def canCarry(self, item):
+        ''' weight limit check, independent of where the item goes '''
+        return self.total_weight + item.weight <= self.max_weight
 
 
-    def putItem(self, item, pivot,axis=None):
-        ''' put item in bin '''
+    def fitMask(self, item, pivots):
+        ''' (inside, clear) masks of shape (pivots, rotations) for item, see auxiliary_methods.fitMask '''
+        rotate = RotationType.ALL if item.updown == True else RotationType.Notupdown
+        dimensions = item.getDimensions(rotate)
+        lo = np.array([[float(p[0]),float(p[1]),float(p[2])] for p in pivots])
+        hi = np.array([[[float(p[0] + d[0]),float(p[1] + d[1]),float(p[2] + d[2])] for d in dimensions] for p in pivots])
+        limit = [float(self.width),float(self.height),float(self.depth)]
+        if not self.broad_phase.filters:
+            return fitMask(lo, hi, self.boxes, limit)
+        # query the broad phase per pivot, pivots with the same candidate rows are tested in one batch
+        groups = {}
+        for k in range(len(pivots)):
+            region = [lo[k,0],hi[k,:,0].max(),lo[k,1],hi[k,:,1].max(),lo[k,2],hi[k,:,2].max()]
+            rows = self.broad_phase.query(region)
+            groups.setdefault(tuple(rows), (rows, []))[1].append(k)
+        inside = np.zeros(hi.shape[:2], dtype=bool)
+        clear = np.zeros(hi.shape[:2], dtype=bool)
+        for rows, members in groups.values():
+            inside[members], clear[members] = fitMask(lo[members], hi[members], self.boxes[rows], limit)
+        return inside, clear
+
+
+    def putItem(self, item, pivot,axis=None,fit_mask=None):
+        ''' put item in bin, fit_mask : this pivot's row of fitMask if already computed '''
         fit = False
+        # cal total weight
+        if not self.canCarry(item):
+            return fit
         valid_item_position = item.position
         item.position = pivot
         rotate = RotationType.ALL if item.updown == True else RotationType.Notupdown
+        if fit_mask is None:
+            inside, clear = self.fitMask(item, [pivot])
+            fit_mask = (inside[0], clear[0])
+        inside, clear = fit_mask
         for i in range(0, len(rotate)):
             item.rotation_type = i
             dimension = item.getDimension()
             # rotatate
-            if (
-                self.width < pivot[0] + dimension[0] or
-                self.height < pivot[1] + dimension[1] or
-                self.depth < pivot[2] + dimension[2]
-            ):
+            if not inside[i]:
                 continue
 
-            fit = True
-
-            for current_item_in_bin in self.items:
-                if intersect(current_item_in_bin, item):
-                    fit = False
-                    break
+            fit = bool(clear[i])
 
             if fit:
-                # cal total weight
-                if self.getTotalWeight() + item.weight > self.max_weight:
-                    fit = False
-                    return fit
-                
                 # fix point float prob
                 if self.fix_point == True :
                         
@@ -186,42 +422,23 @@ class Bin:
                         # fix depth
                         z = self.checkDepth([x,x+float(w),y,y+float(h),z,z+float(d)])
 
-                    # check stability on item 
-                    # rule : 
-                    # 1. Define a support ratio, if the ratio below the support surface does not exceed this ratio, compare the second rule.
-                    # 2. If there is no support under any vertices of the bottom of the item, then fit = False.
+                    # check stability on item, see SupportSurfaces.isStable
                     if self.check_stable == True :
-                        # Cal the surface area of ​​item.
-                        item_area_lower = int(dimension[0] * dimension[1])
-                        # Cal the surface area of ​​the underlying support.
-                        support_area_upper = 0
-                        for i in self.fit_items:
-                            # Verify that the lower support surface area is greater than the upper support surface area * support_surface_ratio.
-                            if z == i[5]  :
-                                area = len(set([ j for j in range(int(x),int(x+int(w)))]) & set([ j for j in range(int(i[0]),int(i[1]))])) * \
-                                len(set([ j for j in range(int(y),int(y+int(h)))]) & set([ j for j in range(int(i[2]),int(i[3]))]))
-                                support_area_upper += area
-
-                        # If not , get four vertices of the bottom of the item.
-                        if support_area_upper / item_area_lower < self.support_surface_ratio :
-                            four_vertices = [[x,y],[x+float(w),y],[x,y+float(h)],[x+float(w),y+float(h)]]
-                            #  If any vertices is not supported, fit = False.
-                            c = [False,False,False,False]
-                            for i in self.fit_items:
-                                if z == i[5] :
-                                    for jdx,j in enumerate(four_vertices) :
-                                        if (i[0] <= j[0] <= i[1]) and (i[2] <= j[1] <= i[3]) :
-                                            c[jdx] = True
-                            if False in c :
-                                item.position = valid_item_position
-                                fit = False
-                                return fit
-                        
-                    self.fit_items = np.append(self.fit_items,np.array([[x,x+float(w),y,y+float(h),z,z+float(d)]]),axis=0)
-                    item.position = [set2Decimal(x),set2Decimal(y),set2Decimal(z)]
+                        if not self.support.isStable(x, y, z, dimension, self.support_surface_ratio, self.unit()) :
+                            item.position = valid_item_position
+                            fit = False
+                            return fit
+
+                    self.addFitItem([x,x+float(w),y,y+float(h),z,z+float(d)])
+                    if self.scaled:
+                        # same whole-unit rounding as set2Decimal, on the scaled grid
+                        scale = 10 ** self.number_of_decimals
+                        item.position = [int(round(i / scale)) * scale for i in (x,y,z)]
+                    else:
+                        item.position = [set2Decimal(x),set2Decimal(y),set2Decimal(z)]
 
                 if fit :
-                    self.items.append(copy.deepcopy(item))
+                    self.recordItem(item)
 
             else :
                 item.position = valid_item_position
@@ -234,71 +451,46 @@ class Bin:
         return fit
 
 
+    def snapAxis(self, unfix_point, axis):
+        ''' slide an interval along axis to the first gap that can hold it '''
+        lo, hi = 2 * axis, 2 * axis + 1
+        bound = float([self.width, self.height, self.depth][axis])
+        # boxes whose whole-unit footprint overlaps on both other axes block this axis.
+        unit = self.unit()
+        blocked = np.ones(len(self.fit_items), dtype=bool)
+        for other in Axis.ALL:
+            if other == axis:
+                continue
+            o_lo, o_hi = 2 * other, 2 * other + 1
+            blocked &= (
+                np.maximum(np.trunc(self.fit_items[:, o_lo] / unit), int(unfix_point[o_lo] / unit)) <
+                np.minimum(np.trunc(self.fit_items[:, o_hi] / unit), int(unfix_point[o_hi] / unit))
+            )
+        starts = np.concatenate(([0.0, bound], self.fit_items[blocked, lo]))
+        ends = np.concatenate(([0.0, bound], self.fit_items[blocked, hi]))
+        # stable sort keeps ties in insertion order, as the original list sort did.
+        order = np.argsort(ends, kind='stable')
+        starts = starts[order]
+        ends = ends[order]
+        gaps = np.flatnonzero(starts[1:] - ends[:-1] >= unfix_point[hi] - unfix_point[lo])
+        if len(gaps):
+            return float(ends[gaps[0]])
+        return unfix_point[lo]
+
+
     def checkDepth(self,unfix_point):
         ''' fix item position z '''
-        z_ = [[0,0],[float(self.depth),float(self.depth)]]
-        for j in self.fit_items:
-            # creat x set
-            x_bottom = set([i for i in range(int(j[0]),int(j[1]))])
-            x_top = set([i for i in range(int(unfix_point[0]),int(unfix_point[1]))])
-            # creat y set
-            y_bottom = set([i for i in range(int(j[2]),int(j[3]))])
-            y_top = set([i for i in range(int(unfix_point[2]),int(unfix_point[3]))])
-            # find intersection on x set and y set.
-            if len(x_bottom & x_top) != 0 and len(y_bottom & y_top) != 0 :
-                z_.append([float(j[4]),float(j[5])])
-        top_depth = unfix_point[5] - unfix_point[4]
-        # find diff set on z_.
-        z_ = sorted(z_, key = lambda z_ : z_[1])
-        for j in range(len(z_)-1):
-            if z_[j+1][0] -z_[j][1] >= top_depth:
-                return z_[j][1]
-        return unfix_point[4]
+        return self.snapAxis(unfix_point, Axis.DEPTH)
 
 
     def checkWidth(self,unfix_point):
         ''' fix item position x ''' 
-        x_ = [[0,0],[float(self.width),float(self.width)]]
-        for j in self.fit_items:
-            # creat z set
-            z_bottom = set([i for i in range(int(j[4]),int(j[5]))])
-            z_top = set([i for i in range(int(unfix_point[4]),int(unfix_point[5]))])
-            # creat y set
-            y_bottom = set([i for i in range(int(j[2]),int(j[3]))])
-            y_top = set([i for i in range(int(unfix_point[2]),int(unfix_point[3]))])
-            # find intersection on z set and y set.
-            if len(z_bottom & z_top) != 0 and len(y_bottom & y_top) != 0 :
-                x_.append([float(j[0]),float(j[1])])
-        top_width = unfix_point[1] - unfix_point[0]
-        # find diff set on x_bottom and x_top.
-        x_ = sorted(x_,key = lambda x_ : x_[1])
-        for j in range(len(x_)-1):
-            if x_[j+1][0] -x_[j][1] >= top_width:
-                return x_[j][1]
-        return unfix_point[0]
+        return self.snapAxis(unfix_point, Axis.WIDTH)
     
 
     def checkHeight(self,unfix_point):
         '''fix item position y '''
-        y_ = [[0,0],[float(self.height),float(self.height)]]
-        for j in self.fit_items:
-            # creat x set
-            x_bottom = set([i for i in range(int(j[0]),int(j[1]))])
-            x_top = set([i for i in range(int(unfix_point[0]),int(unfix_point[1]))])
-            # creat z set
-            z_bottom = set([i for i in range(int(j[4]),int(j[5]))])
-            z_top = set([i for i in range(int(unfix_point[4]),int(unfix_point[5]))])
-            # find intersection on x set and z set.
-            if len(x_bottom & x_top) != 0 and len(z_bottom & z_top) != 0 :
-                y_.append([float(j[2]),float(j[3])])
-        top_height = unfix_point[3] - unfix_point[2]
-        # find diff set on y_bottom and y_top.
-        y_ = sorted(y_,key = lambda y_ : y_[1])
-        for j in range(len(y_)-1):
-            if y_[j+1][0] -y_[j][1] >= top_height:
-                return y_[j][1]
-
-        return unfix_point[2]
+        return self.snapAxis(unfix_point, Axis.HEIGHT)
 
 
     def addCorner(self):
@@ -330,18 +522,62 @@ class Bin:
         z = set2Decimal(self.depth - self.corner)
         pos = [[0,0,0],[0,0,z],[0,y,z],[0,y,0],[x,y,0],[x,0,0],[x,0,z],[x,y,z]]
         item.position = pos[info]
-        self.items.append(item)
+        self.recordItem(item)
 
         corner = [float(item.position[0]),float(item.position[0])+float(self.corner),float(item.position[1]),float(item.position[1])+float(self.corner),float(item.position[2]),float(item.position[2])+float(self.corner)]
 
-        self.fit_items = np.append(self.fit_items,np.array([corner]),axis=0)
+        self.addFitItem(corner)
         return
 
 
+    def toNumber(self, value):
+        ''' float coordinate back to the number type items use in this bin '''
+        if self.scaled:
+            return int(round(value))
+        return set2Decimal(value, self.number_of_decimals)
+
+
+    def recordItem(self, item):
+        ''' add item to items at its current position and rotation '''
+        self.items.append(Placement(item, tuple(item.position), item.rotation_type))
+        self.addBox(self.items[-1])
+
+
+    def addFitItem(self, box):
+        ''' record a snapped x0,x1,y0,y1,z0,z1 box in fit_items and the support surfaces '''
+        self.fit_buffer.append(box)
+        self.support.add(self.fit_buffer.rows[-1])
+
+
+    def addBox(self, item):
+        ''' record a placed item in boxes, the broad phase and the running totals '''
+        [w,h,d] = item.getDimension()
+        [x,y,z] = item.position
+        box = [float(x),float(x + w),float(y),float(y + h),float(z),float(z + d)]
+        index = self.box_buffer.append(box + [float(item.weight)])
+        self.broad_phase.insert(index, box)
+        self.extreme_points.add(item.position, [w,h,d], box, self.boxes)
+        self.item_count += 1
+        self.total_weight += item.weight
+        self.total_volume += item.width * item.height * item.depth
+        self.total_cost += item.cost
+
+
     def clearBin(self):
         ''' clear item which in bin '''
         self.items = []
-        self.fit_items = np.array([[0,self.width,0,self.height,0,0]])
+        self.fit_buffer.clear()
+        self.support.clear()
+        self.addFitItem([0,self.width,0,self.height,0,0])
+        self.box_buffer.clear()
+        self.broad_phase.reset(self)
+        self.extreme_points.reset(self)
+        if self.height_map is not None:
+            self.height_map.reset(self)
+        self.item_count = 0
+        self.total_weight = 0
+        self.total_volume = 0
+        self.total_cost = 0
         return
 
 
@@ -357,6 +593,33 @@ class Packer:
         # self.apex = []
 
 
+    def snapshot(self):
+        ''' packing state of every bin, see Bin.snapshot '''
+        return {
+            'bins': [(bin, bin.snapshot()) for bin in self.bins],
+            'unfit_items': list(self.unfit_items),
+        }
+
+
+    def restore(self, snapshot):
+        ''' undo everything packed since snapshot(), items added since are dropped '''
+        for bin, bin_snapshot in snapshot['bins']:
+            bin.restore(bin_snapshot)
+        self.bins = [bin for bin, _ in snapshot['bins']]
+        self.unfit_items = list(snapshot['unfit_items'])
+        self.items = []
+
+
+    def extend(self, items, **kwargs):
+        ''' 
+        pack more items on top of what the bins already hold, only the new
+        items are placed. kwargs are passed to pack().
+        '''
+        for item in items:
+            self.addItem(item)
+        self.pack(**kwargs)
+
+
     def addBin(self, bin):
         ''' '''
         return self.bins.append(bin)
@@ -390,27 +653,66 @@ class Packer:
                 bin.unfitted_items.append(item)
             return
 
-        for axis in range(0, 3):
-            items_in_bin = bin.items
-            for ib in items_in_bin:
-                pivot = [0, 0, 0]
-                w, h, d = ib.getDimension()
-                if axis == Axis.WIDTH:
-                    pivot = [ib.position[0] + w,ib.position[1],ib.position[2]]
-                elif axis == Axis.HEIGHT:
-                    pivot = [ib.position[0],ib.position[1] + h,ib.position[2]]
-                elif axis == Axis.DEPTH:
-                    pivot = [ib.position[0],ib.position[1],ib.position[2] + d]
-                    
-                if bin.putItem(item, pivot, axis):
-                    fitted = True
-                    break
-            if fitted:
-                break
+        # the weight limit does not depend on the pivot, reject before any geometry
+        if not bin.canCarry(item):
+            bin.unfitted_items.append(item)
+            return
+
+        # corner points of the placed items along each axis, see extreme_points.py
+        pivots = bin.extreme_points.candidates()
+        fitted = self.putOnPivots(bin, item, pivots)
+        if not fitted and bin.extreme_points.prune:
+            # the dominated pivots are only tried when none of the others holds the item
+            tried = {tuple(pivot) for pivot, _ in pivots}
+            rest = [(pivot, axis) for pivot, axis in bin.extreme_points.candidates(prune=False) if tuple(pivot) not in tried]
+            fitted = self.putOnPivots(bin, item, rest)
         if not fitted:
             bin.unfitted_items.append(item)
 
 
+    def putOnPivots(self, bin, item, pivots):
+        ''' put item on the first (pivot, axis) of pivots that holds it, True if one did '''
+        if not pivots:
+            return False
+        # every pivot x rotation at once, putItem only tries the first rotation inside the bin
+        inside, clear = bin.fitMask(item, [pivot for pivot, _ in pivots])
+        viable = inside.any(axis=1) & clear[np.arange(len(pivots)),inside.argmax(axis=1)]
+        for k in np.flatnonzero(viable):
+            pivot, axis = pivots[k]
+            if bin.putItem(item, pivot, axis, (inside[k],clear[k])):
+                return True
+        return False
+
+
+    def pack2HeightMap(self, bin, item, check_stable, support_surface_ratio, resolution=1):
+        ''' pack item to bin with the height-map engine, see height_map.py '''
+        print('packing item : {}'.format(item.partno))
+        if bin.height_map is None or bin.height_map.resolution != resolution:
+            bin.height_map = HeightMap(bin, resolution)
+            # items already in the bin, e.g. packed by pack2Bin
+            for box in bin.boxes:
+                bin.height_map.addBox(box)
+
+        if not bin.canCarry(item):
+            bin.unfitted_items.append(item)
+            return
+
+        best = bin.height_map.findPosition(item, check_stable, support_surface_ratio)
+        if best is None:
+            bin.unfitted_items.append(item)
+            return
+
+        z, cx, cy, rotation, fw, fh, d = best
+        bin.height_map.place(z, cx, cy, fw, fh, d)
+        cell = bin.height_map.cell
+        item.position = [bin.toNumber(cx * cell), bin.toNumber(cy * cell), bin.toNumber(z)]
+        item.rotation_type = rotation
+        [w,h,d] = item.getDimension()
+        [x,y,z] = [float(i) for i in item.position]
+        bin.addFitItem([x,x+float(w),y,y+float(h),z,z+float(d)])
+        bin.recordItem(item)
+
+
     def sortBinding(self,bin):
         ''' sorted by binding '''
         b,front,back = [],[],[]
@@ -464,9 +766,12 @@ class Packer:
         ''' 
         Deviation Of Cargo gravity distribution
         ''' 
-        w = int(bin.width)
-        h = int(bin.height)
-        d = int(bin.depth)
+        # scaled bins work in 10**-n units, measure in whole units as the Decimal path does
+        scale = 10 ** bin.number_of_decimals if bin.scaled else 1
+        unit = lambda value : int(value / scale)
+        w = unit(bin.width)
+        h = unit(bin.height)
+        d = unit(bin.depth)
 
         area1 = [set(range(0,w//2+1)),set(range(0,h//2+1)),0]
         area2 = [set(range(w//2+1,w+1)),set(range(0,h//2+1)),0]
@@ -474,28 +779,14 @@ class Packer:
         area4 = [set(range(w//2+1,w+1)),set(range(h//2+1,h+1)),0]
         area = [area1,area2,area3,area4]
 
-        for i in bin.items:
-
-            x_st = int(i.position[0])
-            y_st = int(i.position[1])
-            if i.rotation_type == 0:
-                x_ed = int(i.position[0] + i.width)
-                y_ed = int(i.position[1] + i.height)
-            elif i.rotation_type == 1:
-                x_ed = int(i.position[0] + i.height)
-                y_ed = int(i.position[1] + i.width)
-            elif i.rotation_type == 2:
-                x_ed = int(i.position[0] + i.height)
-                y_ed = int(i.position[1] + i.depth)
-            elif i.rotation_type == 3:
-                x_ed = int(i.position[0] + i.depth)
-                y_ed = int(i.position[1] + i.height)
-            elif i.rotation_type == 4:
-                x_ed = int(i.position[0] + i.depth)
-                y_ed = int(i.position[1] + i.width)
-            elif i.rotation_type == 5:
-                x_ed = int(i.position[0] + i.width)
-                y_ed = int(i.position[1] + i.depth)
+        # placed boxes already hold the rotated extents
+        for box in bin.boxes:
+
+            x_st = unit(box[0])
+            y_st = unit(box[2])
+            x_ed = unit(box[1])
+            y_ed = unit(box[3])
+            weight = unit(box[6])
 
             x_set = set(range(x_st,int(x_ed)+1))
             y_set = set(range(y_st,y_ed+1))
@@ -503,25 +794,25 @@ class Packer:
             # cal gravity distribution
             for j in range(len(area)):
                 if x_set.issubset(area[j][0]) and y_set.issubset(area[j][1]) : 
-                    area[j][2] += int(i.weight)
+                    area[j][2] += weight
                     break
                 # include x and !include y
                 elif x_set.issubset(area[j][0]) == True and y_set.issubset(area[j][1]) == False and len(y_set & area[j][1]) != 0 : 
-                    y = len(y_set & area[j][1]) / (y_ed - y_st) * int(i.weight)
+                    y = len(y_set & area[j][1]) / (y_ed - y_st) * weight
                     area[j][2] += y
                     if j >= 2 :
-                        area[j-2][2] += (int(i.weight) - x)
+                        area[j-2][2] += (weight - x)
                     else :
-                        area[j+2][2] += (int(i.weight) - y)
+                        area[j+2][2] += (weight - y)
                     break
                 # include y and !include x
                 elif x_set.issubset(area[j][0]) == False and y_set.issubset(area[j][1]) == True and len(x_set & area[j][0]) != 0 : 
-                    x = len(x_set & area[j][0]) / (x_ed - x_st) * int(i.weight)
+                    x = len(x_set & area[j][0]) / (x_ed - x_st) * weight
                     area[j][2] += x
                     if j >= 2 :
-                        area[j-2][2] += (int(i.weight) - x)
+                        area[j-2][2] += (weight - x)
                     else :
-                        area[j+2][2] += (int(i.weight) - x)
+                        area[j+2][2] += (weight - x)
                     break
                 # !include x and !include y
                 elif x_set.issubset(area[j][0])== False and y_set.issubset(area[j][1]) == False and len(y_set & area[j][1]) != 0  and len(x_set & area[j][0]) != 0 :
@@ -530,10 +821,10 @@ class Packer:
                     y_2 = y_ed - y_st - y
                     x = len(x_set & area[0][0])
                     x_2 = x_ed - x_st - x
-                    area[0][2] += x * y / all * int(i.weight)
-                    area[1][2] += x_2 * y / all * int(i.weight)
-                    area[2][2] += x * y_2 / all * int(i.weight)
-                    area[3][2] += x_2 * y_2 / all * int(i.weight)
+                    area[0][2] += x * y / all * weight
+                    area[1][2] += x_2 * y / all * weight
+                    area[2][2] += x * y_2 / all * weight
+                    area[3][2] += x_2 * y_2 / all * weight
                     break
             
         r = [area[0][2],area[1][2],area[2][2],area[3][2]]
@@ -543,32 +834,54 @@ class Packer:
         return result
 
 
-    def pack(self, bigger_first=False,distribute_items=True,fix_point=True,check_stable=True,support_surface_ratio=0.75,binding=[],number_of_decimals=DEFAULT_NUMBER_OF_DECIMALS):
-        '''pack master func '''
+    def pack(self, bigger_first=False,distribute_items=True,fix_point=True,check_stable=True,support_surface_ratio=0.75,binding=[],number_of_decimals=DEFAULT_NUMBER_OF_DECIMALS,scaled_integers=False,engine='pivot',resolution=1,presorted=False,prune_points=False):
+        '''
+        pack master func
+        scaled_integers : pack on integers in 10**-number_of_decimals units instead of
+        Decimals, results are converted back to Decimals before returning.
+        engine : 'pivot' (pack2Bin) or 'height_map' (pack2HeightMap, floor grid of
+        `resolution` units per cell, fix_point is not used).
+        presorted : items are already in packing order (see ItemTable), skip sorting.
+        prune_points : pack2Bin tries dominated pivots last, see extreme_points.py.
+        '''
+        if engine == 'pivot':
+            put = lambda bin, item : self.pack2Bin(bin, item, fix_point, check_stable, support_surface_ratio)
+        elif engine == 'height_map':
+            put = lambda bin, item : self.pack2HeightMap(bin, item, check_stable, support_surface_ratio, resolution)
+        else:
+            raise ValueError('unknown packing engine : {}'.format(engine))
         # set decimals
         for bin in self.bins:
-            bin.formatNumbers(number_of_decimals)
+            bin.extreme_points.prune = prune_points
+            if scaled_integers:
+                bin.scaleNumbers(number_of_decimals)
+            else:
+                bin.formatNumbers(number_of_decimals)
 
         for item in self.items:
-            item.formatNumbers(number_of_decimals)
+            if scaled_integers:
+                item.scaleNumbers(number_of_decimals)
+            else:
+                item.formatNumbers(number_of_decimals)
         # add binding attribute
         self.binding = binding
         # Bin : sorted by volumn
         self.bins.sort(key=lambda bin: bin.getVolume(), reverse=bigger_first)
         # Item : sorted by volumn -> sorted by loadbear -> sorted by level -> binding
-        self.items.sort(key=lambda item: (
-            item.getVolume(),  # Volume
-            (item.width + item.height + item.depth) / 3,  # Average of dimensions
-            math.sqrt(item.width**2 + item.height**2 + item.depth**2),  # Diagonal length
-            item.loadbear,  # Load-bearing capacity
-            item.level,     # Packing priority level
-            item.getMaxArea()  # Maximum area
-        ), reverse=True)  # Sort in descending order
-
-
-        # self.items.sort(key=lambda item: item.getMaxArea(), reverse=bigger_first)
-        self.items.sort(key=lambda item: item.loadbear, reverse=True)
-        self.items.sort(key=lambda item: item.level, reverse=False)
+        if not presorted:
+            self.items.sort(key=lambda item: (
+                item.getVolume(),  # Volume
+                (item.width + item.height + item.depth) / 3,  # Average of dimensions
+                math.sqrt(item.width**2 + item.height**2 + item.depth**2),  # Diagonal length
+                item.loadbear,  # Load-bearing capacity
+                item.level,     # Packing priority level
+                item.getMaxArea()  # Maximum area
+            ), reverse=True)  # Sort in descending order
+
+
+            # self.items.sort(key=lambda item: item.getMaxArea(), reverse=bigger_first)
+            self.items.sort(key=lambda item: item.loadbear, reverse=True)
+            self.items.sort(key=lambda item: item.level, reverse=False)
         # sorted by binding
         if binding != []:
             self.sortBinding(bin)
@@ -576,7 +889,7 @@ class Packer:
         for idx,bin in enumerate(self.bins):
             # pack item to bin
             for item in self.items:
-                self.pack2Bin(bin, item, fix_point, check_stable, support_surface_ratio)
+                put(bin, item)
 
             if binding != []:
                 # resorted
@@ -584,12 +897,11 @@ class Packer:
                 self.items.sort(key=lambda item: item.loadbear, reverse=True)
                 self.items.sort(key=lambda item: item.level, reverse=False)
                 # clear bin
-                bin.items = []
+                bin.clearBin()
                 bin.unfitted_items = self.unfit_items
-                bin.fit_items = np.array([[0,bin.width,0,bin.height,0,0]])
                 # repacking
                 for item in self.items:
-                    self.pack2Bin(bin, item,fix_point,check_stable,support_surface_ratio)
+                    put(bin, item)
             
             # Deviation Of Cargo Gravity Center 
             self.bins[idx].gravity = self.gravityCenter(bin)
@@ -605,8 +917,14 @@ class Packer:
         # put order of items
         self.putOrder()
 
+        # back to Decimals at the output boundary
+        for bin in self.bins:
+            bin.unscaleNumbers()
+        for item in self.items:
+            item.unscaleNumbers()
+
         if self.items != []:
-            self.unfit_items = copy.deepcopy(self.items)
+            self.unfit_items = self.items
             self.items = []
         # for item in self.items.copy():
         #     if item in bin.unfitted_items:
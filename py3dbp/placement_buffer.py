@@ -0,0 +1,38 @@
+import numpy as np
+
+
+class PlacementBuffer:
+    ''' 
+    Preallocated float array that grows by doubling its capacity.
+    rows is a view of the live part, append() and clear() never copy it.
+    '''
+
+    def __init__(self, columns, capacity=64):
+        self.data = np.empty((capacity, columns))
+        self.size = 0
+
+
+    @property
+    def rows(self):
+        ''' live rows, a view into the buffer '''
+        return self.data[:self.size]
+
+
+    def __len__(self):
+        return self.size
+
+
+    def append(self, row):
+        ''' add one row, doubling the capacity when full '''
+        if self.size == len(self.data):
+            grown = np.empty((2 * len(self.data), self.data.shape[1]))
+            grown[:self.size] = self.data
+            self.data = grown
+        self.data[self.size] = row
+        self.size += 1
+        return self.size - 1
+
+
+    def clear(self):
+        ''' drop all rows and keep the capacity '''
+        self.size = 0
@@ -0,0 +1,68 @@
+import numpy as np
+from .placement_buffer import PlacementBuffer
+
+
+class SupportSurfaces:
+    ''' 
+    Top faces of the snapped boxes (Bin.fit_items) grouped by height, so the
+    check_stable rules in Bin.putItem only look at faces level with the item
+    bottom and compute areas arithmetically.
+    '''
+
+    def __init__(self):
+        self.tops = {}
+
+
+    def clear(self):
+        self.tops = {}
+
+
+    def add(self, box):
+        ''' register the top face of a x0,x1,y0,y1,z0,z1 box '''
+        top = float(box[5])
+        if top not in self.tops:
+            self.tops[top] = PlacementBuffer(4, capacity=8)
+        self.tops[top].append(box[:4])
+
+
+    def supportArea(self, x, y, w, h, z, unit=1):
+        ''' 
+        whole-unit area under the [x,x+w) x [y,y+h) bottom face at height z,
+        unit : size of a whole unit in the bin's numbers (10**n when scaled)
+        '''
+        faces = self.tops.get(float(z))
+        if faces is None:
+            return 0
+        faces = np.trunc(faces.rows / unit)
+        x, y, w, h = x / unit, y / unit, float(w) / unit, float(h) / unit
+        dx = np.minimum(int(x + int(w)), faces[:, 1]) - np.maximum(int(x), faces[:, 0])
+        dy = np.minimum(int(y + int(h)), faces[:, 3]) - np.maximum(int(y), faces[:, 2])
+        return int((np.maximum(dx, 0) * np.maximum(dy, 0)).sum())
+
+
+    def verticesSupported(self, x, y, w, h, z):
+        ''' every corner of the bottom face lies on some face at height z '''
+        faces = self.tops.get(float(z))
+        if faces is None:
+            return False
+        faces = faces.rows
+        for vx, vy in ((x, y), (x + w, y), (x, y + h), (x + w, y + h)):
+            if not np.any((faces[:, 0] <= vx) & (vx <= faces[:, 1]) & (faces[:, 2] <= vy) & (vy <= faces[:, 3])):
+                return False
+        return True
+
+
+    def isStable(self, x, y, z, dimension, support_surface_ratio, unit=1):
+        ''' 
+        rule :
+        1. Define a support ratio, if the ratio below the support surface does not exceed this ratio, compare the second rule.
+        2. If there is no support under any vertices of the bottom of the item, then fit = False.
+        '''
+        [w,h,d] = dimension
+        # Cal the surface area of the item.
+        item_area_lower = int(dimension[0] * dimension[1] / unit**2)
+        # Cal the surface area of the underlying support.
+        support_area_upper = self.supportArea(x, y, w, h, z, unit)
+        if support_area_upper / item_area_lower < support_surface_ratio:
+            return self.verticesSupported(x, y, float(w), float(h), z)
+        return True
@@ -1,60 +1,50 @@
-from py3dbp import Packer, Bin, Item, Painter
+from py3dbp import Packer, Bin, Item, Painter, ItemTable
 from py3dbp.constants import RotationType, Axis
 
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import sys
 import time
 
-def pack_items(packed_items, uld, is_stable=False):
-    print(packed_items)
-    # Start timing
-    start = time.time()
-
-    # Unpack ULD parameters
-    uld_id, uld_l, uld_h, uld_b, uld_weight = uld
+def make_item(item, uld_weight):
+    # Unpack item attributes
+    item_id, length, width, height, weight, item_type, cost = item
 
-    # Initialize the packer and ULD bin
-    packer = Packer()
-    box = Bin(str(uld_id), (uld_l, uld_h, uld_b), uld_weight, 0, 0)  # Use ULD dimensions and weight
-    packer.addBin(box)
+    return Item(
+        partno=str(item_id),          # Use the string ID directly
+        name=f'item_{item_id}',       # Descriptive name based on item ID
+        typeof=item_type,             # Use the type field from the item
+        WHD=(length, width, height),  # Dimensions of the item
+        weight=weight,                # Weight of the item
+        level=1,
+        loadbear=uld_weight,
+        updown=True,
+        color='Yellow',
+        cost=cost
+    )
 
-    # Add items to the packer
-    for item in packed_items[1]:
-        # Unpack item attributes
-        item_id, length, width, height, weight, item_type, cost = item
-        
-        # Add item to the packer
-        packer.addItem(Item(
-            partno=str(item_id),          # Use the string ID directly
-            name=f'item_{item_id}',       # Descriptive name based on item ID
-            typeof=item_type,             # Use the type field from the item
-            WHD=(length, width, height),  # Dimensions of the item
-            weight=weight,                # Weight of the item
-            level=1,
-            loadbear=uld_weight,
-            updown=True,
-            color='Yellow',
-            cost=cost
-        ))
-    # Perform the packing operation
+def run_packer(packer, is_stable=False, engine='pivot', presorted=False):
+    # Perform the packing operation, only items added since the last run are placed
     packer.pack(
         bigger_first=True,
         distribute_items=False,
         fix_point=True,
         check_stable=is_stable,
         support_surface_ratio=0.45,
-        number_of_decimals=0
+        number_of_decimals=0,
+        scaled_integers=True,
+        engine=engine,
+        presorted=presorted
     )
 
     # Assign an order to the packed items
     packer.putOrder()
 
-    # Retrieve the packed bin
-    b = packer.bins[0]
-
+def collect_result(b):
     # Initialize storage for coordinates
     coordinates_data = []
 
     fitted_items=[]
-    pcost=0
 
     # Process the packed items and calculate coordinates
     for item in b.items:
@@ -66,11 +56,34 @@ def pack_items(packed_items, uld, is_stable=False):
         # Append coordinates as tuples to the list
         coordinates_data.append((float(x1), float(y1), float(z1), float(x2), float(y2), float(z2)))
         fitted_items.append((item.partno, float(item.width), float(item.height),float(item.depth),float(item.weight),item.typeof,float(item.cost)))
-        
-        pcost+=item.cost
 
-    # Calculate total packed volume
-    total_volume = sum([item.width * item.height * item.depth for item in b.items])
+    # Packed volume and cost are kept as running totals by the bin
+    total_volume = b.total_volume
+    pcost = b.total_cost
+
+    return [total_volume,fitted_items,coordinates_data,pcost]
+
+def pack_items(packed_items, uld, is_stable=False, engine='pivot'):
+    print(packed_items)
+    # Start timing
+    start = time.time()
+
+    # Unpack ULD parameters
+    uld_id, uld_l, uld_h, uld_b, uld_weight = uld
+
+    # Initialize the packer and ULD bin
+    packer = Packer()
+    box = Bin(str(uld_id), (uld_l, uld_h, uld_b), uld_weight, 0, 0)  # Use ULD dimensions and weight
+    packer.addBin(box)
+
+    # Add items to the packer
+    for item in packed_items[1]:
+        packer.addItem(make_item(item, uld_weight))
+
+    run_packer(packer, is_stable, engine)
+
+    # Retrieve the packed bin
+    result = collect_result(packer.bins[0])
 
     # Display total time taken
     stop = time.time()
@@ -78,7 +91,287 @@ def pack_items(packed_items, uld, is_stable=False):
 
     # Return volume and coordinates
 
-    return [total_volume,fitted_items,coordinates_data,pcost]
+    return result
+
+def uld_shape(uld):
+    # Dimensions and weight limit, ULDs of the same shape pack the same parcels identically
+    return tuple(uld[1:5])
+
+def uld_groups(uld_list):
+    # Indices of uld_list by shape, in order of first appearance
+    groups = {}
+    for index, uld in enumerate(uld_list):
+        groups.setdefault(uld_shape(uld), []).append(index)
+    return groups
+
+# Parcel table of the current pack_batch, set once per worker process
+batch_table = None
+
+def set_batch_table(table):
+    global batch_table
+    batch_table = table
+
+def pack_job(uld, indices, is_stable=False, engine='pivot'):
+    # pack_items for parcel rows of batch_table
+    uld_id, uld_l, uld_h, uld_b, uld_weight = uld
+
+    packer = Packer()
+    packer.addBin(Bin(str(uld_id), (uld_l, uld_h, uld_b), uld_weight, 0, 0))
+    for item in batch_table.items(indices, loadbear=uld_weight):
+        packer.addItem(item)
+
+    run_packer(packer, is_stable, engine, presorted=True)
+    return collect_result(packer.bins[0])
+
+def pack_batch(jobs, workers=1, is_stable=False, engine='pivot'):
+    '''
+    pack_items over many (uld, parcels) jobs, results in input order.
+    Parcels are converted once into an ItemTable that each worker
+    process receives a single time. Jobs then only carry row indices.
+    '''
+    table = ItemTable([parcel for _, parcels in jobs for parcel in parcels])
+    ulds = [uld for uld, _ in jobs]
+    indices = [table.lookup(parcels) for _, parcels in jobs]
+    stable = [is_stable] * len(jobs)
+    engines = [engine] * len(jobs)
+
+    if workers <= 1:
+        set_batch_table(table)
+        try:
+            return list(map(pack_job, ulds, indices, stable, engines))
+        finally:
+            set_batch_table(None)
+    with ProcessPoolExecutor(workers, initializer=set_batch_table, initargs=(table,)) as executor:
+        return list(executor.map(pack_job, ulds, indices, stable, engines, chunksize=max(1, len(jobs) // (4 * workers))))
+
+class PackCache:
+    '''
+    Bounded LRU cache of pack_items results. The key is the ULD shape, the
+    parcels sorted by ID, the stability flag and the engine. Parcel order
+    and the ULD ID are not part of the key, so ULDs of the same shape share
+    entries. Entries are evicted least recently used first once
+    there are more than maxsize of them or their estimated size goes over
+    max_bytes.
+    '''
+
+    def __init__(self, maxsize=4096, max_bytes=64 * 2**20):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def parcel(item):
+        # Numbers as floats, parcel rows built from the CSV may carry some of them as strings
+        item_id, length, width, height, weight, item_type, cost = item
+        return (str(item_id), float(length), float(width), float(height), float(weight), item_type, float(cost))
+
+    @staticmethod
+    def key(packed_items, uld, is_stable=False, engine='pivot'):
+        parcels = tuple(sorted((PackCache.parcel(item) for item in packed_items[1]), key=lambda item: item[0]))
+        return (tuple(float(value) for value in uld_shape(uld)), parcels, bool(is_stable), engine)
+
+    @staticmethod
+    def size(key, result):
+        # Rough footprint: the containers plus one tuple per parcel row
+        rows = key[1] + tuple(result[1]) + tuple(result[2])
+        return sys.getsizeof(rows) + sum(sys.getsizeof(row) for row in rows)
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key][0]
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        if key in self.entries:
+            self.nbytes -= self.entries.pop(key)[1]
+        size = self.size(key, result)
+        self.entries[key] = (result, size)
+        self.nbytes += size
+        while self.entries and (len(self.entries) > self.maxsize or self.nbytes > self.max_bytes):
+            self.nbytes -= self.entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.nbytes}
+
+pack_cache = PackCache()
+
+def cached_pack_items(packed_items, uld, is_stable=False, engine='pivot', cache=None):
+    # pack_items behind an LRU cache, the returned result is shared and must not be modified
+    cache = pack_cache if cache is None else cache
+    key = cache.key(packed_items, uld, is_stable, engine)
+    result = cache.get(key)
+    if result is None:
+        result = pack_items(packed_items, uld, is_stable, engine)
+        cache.put(key, result)
+    return result
+
+def pack_candidates(candidates, is_stable, executor=None):
+    # pack_items for every (packed_items, uld) pair, cache misses are packed on the executor when there is one
+    keys = [pack_cache.key(packed_items, uld, is_stable) for packed_items, uld in candidates]
+    results = [pack_cache.get(key) for key in keys]
+    # Candidates with the same key, e.g. the same parcels in ULDs of one shape, are packed once
+    first = {}
+    for j in range(len(candidates)):
+        if results[j] is None:
+            first.setdefault(keys[j], j)
+    misses = list(first.values())
+    if executor is None:
+        packed = [pack_items(candidates[j][0], candidates[j][1], is_stable) for j in misses]
+    else:
+        packed = list(executor.map(pack_items, [candidates[j][0] for j in misses], [candidates[j][1] for j in misses], [is_stable] * len(misses)))
+    fresh = {}
+    for j, result in zip(misses, packed):
+        pack_cache.put(keys[j], result)
+        fresh[keys[j]] = result
+    return [result if result is not None else fresh[key] for key, result in zip(keys, results)]
+
+class FitIndex:
+    '''
+    Whether a parcel fits an empty ULD of a shape in some orientation and
+    within its weight limit. build() fills the index for all parcels and
+    ULD shapes up front, pairs missing from it are computed on first use.
+    '''
+
+    def __init__(self):
+        self.entries = {}
+
+    @staticmethod
+    def parcel_key(item):
+        # Parcel rows may carry numbers as read from the CSV
+        return (str(item[0]),) + tuple(float(value) for value in item[1:5])
+
+    @staticmethod
+    def check(key, shape):
+        return all(a <= b for a, b in zip(sorted(key[1:4]), sorted(shape[:3]))) and key[4] <= shape[3]
+
+    def build(self, parcels, uld_list):
+        keys = [self.parcel_key(item) for item in parcels]
+        for shape in uld_groups(uld_list):
+            for key in keys:
+                self.entries[(shape, key)] = self.check(key, shape)
+
+    def fits(self, item, uld):
+        entry = (uld_shape(uld), self.parcel_key(item))
+        if entry not in self.entries:
+            self.entries[entry] = self.check(entry[1], entry[0])
+        return self.entries[entry]
+
+# Shared by the pack filters and the annealer, the controller builds it for its parcels and ULDs
+fit_index = FitIndex()
+
+class PackFilter:
+    '''
+    Pre-filter of PackingSession.try_extend. A call is skipped when none of
+    the extra parcels can be added: all are placed already, none fits the
+    ULD shape, or the smallest fitting one exceeds the residual volume or
+    weight of the committed packing. The residuals come from the bin's
+    running totals. Counts checked and pruned calls by reason, for the
+    sessions it is given to.
+    '''
+
+    def __init__(self, index=None):
+        self.index = fit_index if index is None else index
+        self.checked = 0
+        self.pruned = {'placed': 0, 'fit': 0, 'volume': 0, 'weight': 0}
+
+    def reason(self, session, extra_items):
+        # Why extending the session with extra_items cannot place a parcel, None when it might
+        self.checked += 1
+        keys = [self.index.parcel_key(item) for item in extra_items if str(item[0]) not in session.placed]
+        fitting = [key for key in keys if self.index.fits(key, session.uld)]
+        uld_id, uld_l, uld_h, uld_b, uld_weight = session.uld
+        if not keys:
+            reason = 'placed'
+        elif not fitting:
+            reason = 'fit'
+        elif min(key[1] * key[2] * key[3] for key in fitting) > uld_l * uld_h * uld_b - float(session.result[0]):
+            reason = 'volume'
+        elif min(key[4] for key in fitting) > uld_weight - float(session.bin.getTotalWeight()):
+            reason = 'weight'
+        else:
+            return None
+        self.pruned[reason] += 1
+        return reason
+
+    def stats(self):
+        return {'checked': self.checked, 'pruned': sum(self.pruned.values()), **self.pruned}
+
+class PackingSession:
+    '''
+    Resumable pack_items: the base parcels are packed once, then candidate
+    parcels are placed on top with try_extend() and kept with commit() or
+    dropped with rollback(), or packed on a pickled copy with extended() and
+    taken back with adopt(). result has the pack_items layout. try_extend()
+    calls that pack_filter proves cannot place a parcel return the committed
+    result without packing. Sessions get their own PackFilter unless one is
+    passed in to count several sessions together.
+    '''
+
+    def __init__(self, packed_items, uld, is_stable=False, engine='pivot', pack_filter=None):
+        self.uld = uld
+        self.is_stable = is_stable
+        self.engine = engine
+        self.pack_filter = PackFilter() if pack_filter is None else pack_filter
+        # IDs of the committed parcels
+        self.placed = set()
+
+        uld_id, uld_l, uld_h, uld_b, uld_weight = uld
+        self.packer = Packer()
+        self.bin = Bin(str(uld_id), (uld_l, uld_h, uld_b), uld_weight, 0, 0)
+        self.packer.addBin(self.bin)
+        self.extend(packed_items[1])
+        self.commit()
+
+    def extend(self, extra_items):
+        # Parcels already in the ULD are not placed twice
+        for item in extra_items:
+            if str(item[0]) not in self.placed:
+                self.packer.addItem(make_item(item, self.uld[4]))
+        run_packer(self.packer, self.is_stable, self.engine)
+        self.result = collect_result(self.bin)
+        return self.result
+
+    def try_extend(self, extra_items):
+        # Result of packing the committed parcels plus extra_items, call commit() or rollback() next
+        self.rollback()
+        if self.pack_filter.reason(self, extra_items) is not None:
+            return self.result
+        return self.extend(extra_items)
+
+    def probe(self, extra_items):
+        # try_extend without keeping the result, the session is left as committed
+        result = self.try_extend(extra_items)
+        self.rollback()
+        return result
+
+    def extended(self, extra_items):
+        # try_extend on a copy of the session in a worker process, the copy is returned with its packing
+        self.try_extend(extra_items)
+        return self
+
+    def adopt(self, other):
+        # Take over and commit the packing of a copy returned by extended()
+        self.packer, self.bin, self.result = other.packer, other.bin, other.result
+        self.commit()
+
+    def commit(self):
+        self.snapshot = self.packer.snapshot()
+        self.committed = self.result
+        self.placed = {fitted[0] for fitted in self.result[1]}
+
+    def rollback(self):
+        self.packer.restore(self.snapshot)
+        self.result = self.committed
 
 # Example usage:
 if __name__ == "__main__":
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+
+
+# Bumped when the stored record changes, older entries then never match and age out
+RECORD_FORMAT = 2
+
+
+def canonical(items):
+    # Parcel rows as JSON-stable lists with float numbers, sorted by ID
+    return sorted(
+        ([str(item[0]), float(item[1]), float(item[2]), float(item[3]), float(item[4]), item[5], float(item[6])] for item in items),
+        key=lambda row: row[0]
+    )
+
+
+def digest(*parts):
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':')).encode()).hexdigest()
+
+
+class SolveCache:
+    '''
+    Persistent content-addressed cache of solver results in SQLite. An entry
+    is keyed by a hash of the solver kind and parameters, the ULD box and
+    the offered parcels, and holds the selection [volume, packed_items,
+    cost]. Entries are evicted least recently used first once the stored
+    records go over max_bytes. nearest() finds a stored selection for the
+    same ULD shape whose parcels are all offered again, used as a warm
+    start on a miss.
+    '''
+
+    def __init__(self, path="solve_cache.sqlite", max_bytes=256 * 2**20, candidates=64):
+        self.path = path
+        self.max_bytes = max_bytes
+        # Entries of the same shape scanned by nearest(), most recently used first
+        self.candidates = candidates
+        self.hits = 0
+        self.near = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, shape TEXT, record BLOB, size INTEGER, used REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_shape ON results (shape, used)")
+        self.db.commit()
+
+    @staticmethod
+    def key(kind, box, items, params=()):
+        shape = digest(RECORD_FORMAT, kind, [float(value) for value in box], list(params))
+        return shape, digest(shape, canonical(items))
+
+    @staticmethod
+    def load(blob):
+        selection = json.loads(zlib.decompress(blob))
+        selection[1] = [tuple(item) for item in selection[1]]
+        return selection
+
+    def get(self, kind, box, items, params=()):
+        # Selection stored for exactly these parcels, or None
+        shape, key = self.key(kind, box, items, params)
+        row = self.db.execute("SELECT record FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        self.hits += 1
+        return self.load(row[0])
+
+    def nearest(self, kind, box, items, params=()):
+        # Largest stored selection of the same shape made only of offered parcels, or None
+        shape, key = self.key(kind, box, items, params)
+        offered = {tuple(row) for row in canonical(items)}
+        best = None
+        rows = self.db.execute(
+            "SELECT record FROM results WHERE shape = ? ORDER BY used DESC LIMIT ?", (shape, self.candidates)
+        )
+        for (blob,) in rows:
+            selection = self.load(blob)
+            if all(tuple(row) in offered for row in canonical(selection[1])):
+                if best is None or len(selection[1]) > len(best[1]):
+                    best = selection
+        if best is not None:
+            self.near += 1
+        return best
+
+    def put(self, kind, box, items, params, selection):
+        shape, key = self.key(kind, box, items, params)
+        blob = zlib.compress(json.dumps(selection, separators=(',', ':'), default=float).encode())
+        self.db.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, shape, blob, len(blob), time.time())
+        )
+        self.evict()
+        self.db.commit()
+
+    def evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM results ORDER BY used").fetchall():
+            self.db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        self.db.execute("DELETE FROM results")
+        self.db.commit()
+
+    def stats(self):
+        entries, nbytes = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {'hits': self.hits, 'near': self.near, 'misses': self.misses, 'entries': entries, 'bytes': nbytes}
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,30 @@
+import json
+import os
+import sys
+
+# The modules live at the repository root, next to the controller
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pack_items results of commit 0ab3545 for parcels sampled from data_file.csv
+with open(os.path.join(os.path.dirname(__file__), 'data', 'pack_items_baseline.json')) as f:
+    BASELINE = json.load(f)
+
+
+def as_lists(result):
+    # pack_items result with rows as lists, the layout of the baseline fixture
+    return [result[0], [list(row) for row in result[1]], [list(row) for row in result[2]], result[3]]
+
+
+def check_layout(bin):
+    # Every packed item inside the bin and no two of them overlapping
+    boxes = []
+    for item in bin.items:
+        position = [float(value) for value in item.position]
+        dimension = [float(value) for value in item.getDimension()]
+        boxes.append((position, [p + d for p, d in zip(position, dimension)]))
+    limit = (float(bin.width), float(bin.height), float(bin.depth))
+    for low, high in boxes:
+        assert all(0 <= a and b <= c for a, b, c in zip(low, high, limit))
+    for i in range(len(boxes)):
+        for j in range(i):
+            assert not all(boxes[i][0][k] < boxes[j][1][k] and boxes[j][0][k] < boxes[i][1][k] for k in range(3))
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from conftest import BASELINE
+from annealing import Annealer, AnnealingState, InsertMove, SwapMove, RemoveMove, Proposal, packing_rows
+from runner import pack_items
+
+
+def start_state():
+    # Two ULDs of the first baseline case with a few parcels each, the rest unpacked
+    case = BASELINE[0]
+    uld_list = [[case['uld'][0] + '-%d' % u] + case['uld'][1:] for u in range(2)]
+    parcels = {item[0]: tuple(item) for item in case['items']}
+    economy = [item for item in case['items'] if item[5] == 'Economy']
+    packed_data = {}
+    bin_cost = {}
+    for u, uld in enumerate(uld_list):
+        result = pack_items([0, economy[6 * u:6 * u + 6]], uld)
+        packed_data[u] = packing_rows(result)
+        bin_cost[u] = result[3]
+    packed = {row[0] for rows in packed_data.values() for row in rows}
+    unpacked = [parcels[parcel_id] for parcel_id in parcels if parcel_id not in packed]
+    return Annealer(uld_list, parcels), AnnealingState(packed_data, bin_cost, unpacked)
+
+
+def contents(state):
+    assert all(state.unpacked[j][0] == parcel_id for parcel_id, j in state.position.items())
+    return state.packed_data, state.bin_cost, state.total, sorted(state.unpacked)
+
+
+@pytest.mark.parametrize('move', [InsertMove(), SwapMove(), RemoveMove()], ids=lambda move: type(move).__name__)
+def test_apply_then_undo_restores_the_state(move):
+    annealer, state = start_state()
+    before = contents(state.copy())
+    proposal = move.propose(annealer, state, random.Random(0))
+    assert proposal is not None
+    undo = state.apply(proposal, annealer.parcels)
+    assert state.total == before[2] + proposal.delta
+    assert {row[0] for rows in state.packed_data.values() for row in rows}.isdisjoint(row[0] for row in state.unpacked)
+    state.apply(undo, annealer.parcels)
+    assert contents(state) == before
+
+
+class ScriptedMove:
+    # Sets the cost of bin 0 to the next scripted value, then proposes nothing
+    def __init__(self, costs):
+        self.costs = list(costs)
+
+    def propose(self, annealer, state, rng, executor=None):
+        if not self.costs:
+            return None
+        return Proposal(state, {0: ([], self.costs.pop(0))})
+
+
+class AcceptAll(random.Random):
+    # Metropolis draws that accept every proposal
+    def random(self):
+        return 0.0
+
+
+def test_run_returns_the_best_state_seen():
+    annealer = Annealer([['U', 1, 1, 1, 1]], {}, moves=[(ScriptedMove([5, 10, 2, 1]), 1)],
+                        initial_temp=100, final_temp=1, cooling_rate=0.5)
+    state = AnnealingState({0: []}, {0: 0}, [])
+    best, history = annealer.run(state, AcceptAll(0))
+    assert history == [0, 5, 10, 2, 1, 1, 1, 1]
+    assert state.total == 1
+    assert best.total == 10 and best.bin_cost == {0: 10}
@@ -0,0 +1,27 @@
+import pytest
+
+from conftest import BASELINE
+import assignment
+from assignment import assign_parcels
+
+
+@pytest.mark.parametrize('solver', ['heuristic', 'milp'])
+def test_assignment_places_each_parcel_once(solver):
+    if solver == 'milp' and assignment.Model is None:
+        pytest.skip('gurobipy is not installed')
+    case = BASELINE[0]
+    items = case['items']
+    priority = [item for item in items if item[5] == 'Priority']
+    economy = [item for item in items if item[5] != 'Priority']
+    uld_list = [[case['uld'][0] + '-%d' % u] + case['uld'][1:] for u in range(3)]
+    packed_data, bin_cost, unpacked_economy, unpacked_priority, n_p = assign_parcels(
+        priority, economy, uld_list, 5000, solver=solver)
+    ids = [row[0] for rows in packed_data.values() for row in rows]
+    assert len(ids) == len(set(ids))
+    assert set(ids) | {str(item[0]) for item in unpacked_economy + unpacked_priority} == {str(item[0]) for item in items}
+    for u, rows in packed_data.items():
+        for row in rows:
+            x1, y1, z1, x2, y2, z2 = row[2:]
+            assert 0 <= x1 and 0 <= y1 and 0 <= z1
+            assert all(a <= b for a, b in zip((x2, y2, z2), uld_list[u][1:4]))
+    assert n_p == sum(any(row[1] == 'Priority' for row in rows) for rows in packed_data.values())
@@ -0,0 +1,18 @@
+import pytest
+
+from conftest import BASELINE, as_lists
+from py3dbp import Packer, Bin
+from py3dbp.broad_phase import BruteForce, UniformGrid
+from runner import make_item, run_packer, collect_result
+
+
+@pytest.mark.parametrize('broad_phase', [BruteForce, UniformGrid, lambda: UniformGrid(cells_per_axis=2)])
+@pytest.mark.parametrize('case', BASELINE, ids=lambda case: '%s-%d-%s' % (case['uld'][0], len(case['items']), case['stable']))
+def test_broad_phase_matches_baseline(case, broad_phase):
+    uld_id, uld_l, uld_h, uld_b, uld_weight = case['uld']
+    packer = Packer()
+    packer.addBin(Bin(uld_id, (uld_l, uld_h, uld_b), uld_weight, 0, 0, broad_phase=broad_phase()))
+    for item in case['items']:
+        packer.addItem(make_item(item, uld_weight))
+    run_packer(packer, case['stable'])
+    assert as_lists(collect_result(packer.bins[0])) == case['result']
@@ -0,0 +1,38 @@
+import io
+import contextlib
+
+import pytest
+
+from conftest import BASELINE, check_layout
+from py3dbp import Packer, Bin
+from runner import make_item
+
+
+def pack_case(case, **kwargs):
+    uld_id, uld_l, uld_h, uld_b, uld_weight = case['uld']
+    packer = Packer()
+    packer.addBin(Bin(uld_id, (uld_l, uld_h, uld_b), uld_weight, 0, 0))
+    for item in case['items']:
+        packer.addItem(make_item(item, uld_weight))
+    with contextlib.redirect_stdout(io.StringIO()):
+        packer.pack(bigger_first=True, distribute_items=False, fix_point=True, check_stable=case['stable'],
+                    support_surface_ratio=0.45, number_of_decimals=0, scaled_integers=True, **kwargs)
+    return packer.bins[0]
+
+
+@pytest.mark.parametrize('case', BASELINE[:4])
+def test_pruned_candidates_are_not_dominated(case):
+    points = pack_case(case).extreme_points
+    pruned = [[float(value) for value in pivot] for pivot, axis in points.candidates(prune=True)]
+    assert 0 < len(pruned) <= len(points.candidates())
+    for p in pruned:
+        assert not any(q != p and all(a <= b for a, b in zip(q, p)) for q in pruned)
+
+
+@pytest.mark.parametrize('case', BASELINE)
+def test_pruned_packing_is_valid(case):
+    bin = pack_case(case, prune_points=True)
+    check_layout(bin)
+    # Items no pruned pivot holds still get the dominated ones, so small manifests are placed in full
+    if len(case['result'][1]) == len(case['items']):
+        assert len(bin.items) == len(case['items'])
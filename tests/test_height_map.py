@@ -0,0 +1,40 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+from conftest import check_layout
+from py3dbp import Packer, Bin, Item
+
+
+def random_manifest(seed, n=40):
+    rng = random.Random(seed)
+    box = tuple(rng.randint(60, 200) for _ in range(3))
+    items = [('P%d' % i, tuple(rng.randint(10, 80) for _ in range(3)), rng.randint(1, 50)) for i in range(n)]
+    return box, items
+
+
+@pytest.mark.parametrize('scaled', [False, True])
+@pytest.mark.parametrize('is_stable', [False, True])
+@pytest.mark.parametrize('resolution', [1, 5])
+@pytest.mark.parametrize('seed', range(3))
+def test_height_map_layout_is_valid(seed, resolution, is_stable, scaled):
+    box, items = random_manifest(seed)
+    packer = Packer()
+    packer.addBin(Bin('B', box, 10**6, 0, 0))
+    for partno, whd, weight in items:
+        packer.addItem(Item(partno, partno, 'cube', whd, weight, 1, 100, True, 'red', 1))
+    with contextlib.redirect_stdout(io.StringIO()):
+        packer.pack(bigger_first=True, distribute_items=False, check_stable=is_stable, support_surface_ratio=0.45,
+                    number_of_decimals=0, scaled_integers=scaled, engine='height_map', resolution=resolution)
+    bin = packer.bins[0]
+    assert bin.items
+    assert len(bin.items) + len(bin.unfitted_items) == len(items)
+    check_layout(bin)
+    # Items are dropped, each one rests on the floor or on the top face of an item under it
+    boxes = [([float(v) for v in item.position], [float(v) for v in item.getDimension()]) for item in bin.items]
+    for (x, y, z), (w, h, d) in boxes:
+        assert z == 0 or any(
+            z == oz + od and x < ox + ow and ox < x + w and y < oy + oh and oy < y + h
+            for (ox, oy, oz), (ow, oh, od) in boxes)
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from conftest import BASELINE, as_lists
+from py3dbp import Packer, Bin, Item
+from runner import pack_items
+
+
+def sample_manifest(seed, n=20):
+    # Parcels and a box with two decimals, the ULDs in data_file.csv are whole numbers
+    rng = random.Random(seed)
+    box = tuple(round(rng.uniform(20, 40), 2) for _ in range(3))
+    items = [('P%d' % i,) + tuple(round(rng.uniform(3, 15), 2) for _ in range(4)) for i in range(n)]
+    return box, items
+
+
+def pack_decimals(box, items, scaled, is_stable):
+    packer = Packer()
+    packer.addBin(Bin('B', box, 5000, 0, 0))
+    for item in items:
+        packer.addItem(Item(item[0], item[0], 'cube', item[1:4], item[4], 1, 100, True, 'red', 1))
+    packer.pack(bigger_first=True, distribute_items=False, fix_point=True, check_stable=is_stable,
+                support_surface_ratio=0.45, number_of_decimals=2, scaled_integers=scaled)
+    return [(b.partno, tuple(float(v) for v in b.position), b.rotation_type) for b in packer.bins[0].items]
+
+
+@pytest.mark.parametrize('case', BASELINE, ids=lambda case: '%s-%d-%s' % (case['uld'][0], len(case['items']), case['stable']))
+def test_pack_items_matches_baseline(case):
+    result = pack_items([0, case['items']], case['uld'], case['stable'])
+    assert as_lists(result) == case['result']
+
+
+@pytest.mark.parametrize('is_stable', [False, True])
+@pytest.mark.parametrize('seed', range(4))
+def test_scaled_matches_decimal(seed, is_stable):
+    box, items = sample_manifest(seed)
+    assert pack_decimals(box, items, True, is_stable) == pack_decimals(box, items, False, is_stable)
@@ -0,0 +1,13 @@
+import pytest
+
+from conftest import BASELINE, as_lists
+from runner import pack_batch, pack_items
+
+
+@pytest.mark.parametrize('is_stable', [False, True])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_pack_batch_matches_pack_items(workers, is_stable):
+    # The same parcels in several jobs share rows of the batch table
+    jobs = [(case['uld'], case['items']) for case in BASELINE] + [(BASELINE[1]['uld'], BASELINE[0]['items'][:20])]
+    expected = [as_lists(pack_items([0, parcels], uld, is_stable)) for uld, parcels in jobs]
+    assert [as_lists(result) for result in pack_batch(jobs, workers, is_stable)] == expected
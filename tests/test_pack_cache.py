@@ -0,0 +1,36 @@
+from conftest import BASELINE, as_lists
+from runner import cached_pack_items, PackCache
+
+
+def test_pack_cache_key_ignores_order_and_number_types():
+    case = BASELINE[2]
+    items = case['items']
+    as_strings = [[str(value) if isinstance(value, int) else value for value in item] for item in items]
+    key = PackCache.key([0, items], case['uld'], case['stable'])
+    assert PackCache.key([0, items[::-1]], case['uld'], case['stable']) == key
+    assert PackCache.key([0, as_strings], case['uld'], case['stable']) == key
+    assert PackCache.key([0, items], ['other'] + case['uld'][1:], case['stable']) == key
+    assert PackCache.key([0, items], case['uld'], not case['stable']) != key
+
+
+def test_cached_pack_items_matches_pack_items():
+    cache = PackCache()
+    case = BASELINE[4]
+    first = cached_pack_items([0, case['items']], case['uld'], case['stable'], cache=cache)
+    again = cached_pack_items([0, case['items'][::-1]], case['uld'], case['stable'], cache=cache)
+    assert as_lists(first) == case['result']
+    assert again is first
+    assert cache.stats()['hits'] == 1
+
+
+def test_pack_cache_evicts_least_recently_used():
+    cache = PackCache(maxsize=2)
+    case = BASELINE[2]
+    keys = [PackCache.key([0, case['items'][:n]], case['uld']) for n in (1, 2, 3)]
+    results = [[float(n), [], [], 0.0] for n in (1, 2, 3)]
+    cache.put(keys[0], results[0])
+    cache.put(keys[1], results[1])
+    assert cache.get(keys[0]) is results[0]
+    cache.put(keys[2], results[2])
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is results[0] and cache.get(keys[2]) is results[2]
@@ -0,0 +1,47 @@
+import csv
+import os
+import random
+
+import pytest
+
+from runner import pack_items, PackFilter, PackingSession
+
+with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data_file.csv')) as f:
+    ROWS = list(csv.reader(f))
+ULDS = [[row[0]] + [int(value) for value in row[1:5]] for row in ROWS if row[0].startswith('U')]
+PARCELS = [(row[0], *(int(value) for value in row[1:5]), row[5], int(row[6]) if row[6] != '-' else 10**9)
+           for row in ROWS if row[0].startswith('P')]
+
+
+def candidates(rng, session):
+    # Extra parcels of the kinds the filter looks at: placed, oversized, heavy and plain ones
+    placed = [item for item in PARCELS if item[0] in session.placed]
+    grow = lambda item, factor: (item[0] + '-x',) + tuple(value * factor for value in item[1:4]) + item[4:]
+    yield rng.sample(placed, min(2, len(placed)))
+    yield [grow(item, 3) for item in rng.sample(PARCELS, 2)]
+    yield [grow(item, 1.6) for item in rng.sample(PARCELS, 2)]
+    yield [item[:4] + (session.uld[4],) + item[5:] for item in rng.sample(PARCELS, 2)]
+    for n in (1, 3):
+        yield rng.sample(PARCELS, n)
+
+
+@pytest.mark.parametrize('is_stable', [False, True])
+def test_rejected_candidates_cannot_be_packed(is_stable):
+    rng = random.Random(is_stable)
+    pack_filter = PackFilter()
+    for manifest in range(6):
+        uld = rng.choice(ULDS)
+        session = PackingSession([0, rng.sample(PARCELS, rng.choice([10, 30, 60]))], uld, is_stable, pack_filter=pack_filter)
+        committed = {fitted[0] for fitted in session.result[1]}
+        for extra in candidates(rng, session):
+            reason = pack_filter.reason(session, extra)
+            if reason is None:
+                continue
+            # The unfiltered extension places no extra parcel
+            session.rollback()
+            assert {fitted[0] for fitted in session.extend(extra)[1]} == committed
+            session.rollback()
+            if reason == 'fit':
+                assert pack_items([0, extra], uld, is_stable)[1] == []
+    # Every reason was exercised
+    assert all(pack_filter.pruned.values())
@@ -0,0 +1,24 @@
+import pytest
+
+from conftest import BASELINE
+from preselect import preselect, preselect_packing, preselect_economy_packing
+
+
+@pytest.mark.parametrize('is_stable', [False, True])
+@pytest.mark.parametrize('preselector', [preselect_packing, preselect_economy_packing])
+def test_preselection_fits_the_uld(preselector, is_stable):
+    case = BASELINE[0]
+    uld_id, uld_l, uld_h, uld_b, uld_weight = case['uld']
+    volume, packed_items, cost = preselector(case['items'], uld_l, uld_h, uld_b, uld_weight, is_stable)
+    ids = [str(item[0]) for item in packed_items]
+    assert packed_items and len(ids) == len(set(ids))
+    assert volume <= uld_l * uld_h * uld_b
+    assert sum(item[4] for item in packed_items) <= uld_weight
+    assert cost == sum(item[6] for item in packed_items)
+
+
+@pytest.mark.parametrize('orderings', [0, 4])
+def test_orderings_out_of_range(orderings):
+    case = BASELINE[0]
+    with pytest.raises(ValueError):
+        preselect(case['items'], *case['uld'][1:5], orderings=orderings)
@@ -0,0 +1,54 @@
+import contextlib
+import io
+import pickle
+
+import pytest
+
+from conftest import BASELINE, as_lists
+from py3dbp import Packer, Bin
+from runner import make_item, PackingSession
+
+
+@pytest.mark.parametrize('is_stable', [False, True])
+def test_pickled_session_probe_matches_live(is_stable):
+    case = BASELINE[0]
+    session = PackingSession([0, case['items'][:10]], case['uld'], is_stable)
+    extra = case['items'][10:20]
+    copy = pickle.loads(pickle.dumps(session))
+    assert as_lists(copy.probe(extra)) == as_lists(session.probe(extra))
+
+
+def test_rollback_restores_committed_packing():
+    case = BASELINE[0]
+    session = PackingSession([0, case['items'][:10]], case['uld'])
+    committed = as_lists(session.result)
+    first = as_lists(session.try_extend(case['items'][10:20]))
+    session.rollback()
+    assert as_lists(session.result) == committed
+    assert as_lists(session.probe(case['items'][10:20])) == first
+    # Committed parcels are kept and not placed twice by a later extension
+    session.try_extend(case['items'][10:20])
+    session.commit()
+    result = session.try_extend(case['items'][:25])
+    ids = [fitted[0] for fitted in result[1]]
+    assert len(ids) == len(set(ids))
+    assert set(ids) >= {fitted[0] for fitted in first[1]}
+
+
+def test_restore_rebuilds_a_dropped_height_map():
+    case = BASELINE[2]
+    uld_id, uld_l, uld_h, uld_b, uld_weight = case['uld']
+    packer = Packer()
+    bin = Bin(uld_id, (uld_l, uld_h, uld_b), uld_weight, 0, 0)
+    packer.addBin(bin)
+    empty = packer.snapshot()
+    with contextlib.redirect_stdout(io.StringIO()):
+        packer.extend([make_item(item, uld_weight) for item in case['items'][:3]], engine='height_map', resolution=2)
+    packed = packer.snapshot()
+    tops = bin.height_map.tops.copy()
+    packer.restore(empty)
+    assert bin.height_map is None
+    packer.restore(packed)
+    assert bin.height_map.resolution == 2
+    assert (bin.height_map.tops == tops).all()
+    assert len(bin.items) == 3
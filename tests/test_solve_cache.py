@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import solve_cache
+from solve_cache import SolveCache
+
+BOX = (100, 80, 60, 500)
+ITEMS = [('P-%d' % i, 10 + i, 20, 30, 5, 'Economy', 100 + i) for i in range(6)]
+
+
+def selection(items):
+    return [sum(item[1] * item[2] * item[3] for item in items), [tuple(item) for item in items], sum(item[6] for item in items)]
+
+
+def test_get_matches_any_order_and_number_type(tmp_path):
+    cache = SolveCache(str(tmp_path / 'cache.sqlite'))
+    cache.put('cost', BOX, ITEMS, (False, 100), selection(ITEMS[:3]))
+    as_strings = [(item[0],) + tuple(str(value) for value in item[1:5]) + (item[5], str(item[6])) for item in ITEMS]
+    assert cache.get('cost', BOX, ITEMS[::-1], (False, 100)) == selection(ITEMS[:3])
+    assert cache.get('cost', BOX, as_strings, (False, 100)) == selection(ITEMS[:3])
+    assert cache.get('cost', BOX, ITEMS, (True, 100)) is None
+    assert cache.get('count', BOX, ITEMS, (False, 100)) is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+
+
+def test_nearest_only_returns_offered_parcels(tmp_path):
+    cache = SolveCache(str(tmp_path / 'cache.sqlite'))
+    cache.put('cost', BOX, ITEMS[:4], (), selection(ITEMS[:2]))
+    cache.put('cost', BOX, ITEMS, (), selection(ITEMS[2:5]))
+    cache.put('cost', (1, 1, 1, 1), ITEMS, (), selection(ITEMS))
+    # The largest stored selection made of offered parcels, of the same shape
+    assert cache.nearest('cost', BOX, ITEMS[:5], ()) == selection(ITEMS[2:5])
+    assert cache.nearest('cost', BOX, ITEMS[:4], ()) == selection(ITEMS[:2])
+    assert cache.nearest('cost', BOX, ITEMS[3:], ()) is None
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    # A clock that ticks on every use, so no two records share a time
+    clock = iter(range(1000))
+    monkeypatch.setattr(solve_cache, 'time', SimpleNamespace(time=lambda: next(clock)))
+    cache = SolveCache(str(tmp_path / 'cache.sqlite'))
+    for n in range(1, 4):
+        cache.put('cost', BOX, ITEMS[:n], (), selection(ITEMS[:n]))
+    cache.get('cost', BOX, ITEMS[:1], ())
+    # Room for two of the three records, the one used longest ago goes
+    cache.max_bytes = cache.stats()['bytes'] - 1
+    cache.put('cost', BOX, ITEMS[:3], (), selection(ITEMS[:3]))
+    assert cache.get('cost', BOX, ITEMS[:2], ()) is None
+    assert cache.get('cost', BOX, ITEMS[:1], ()) is not None
+    assert cache.get('cost', BOX, ITEMS[:3], ()) is not None
+
+
+def test_record_format_bump_misses_old_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = SolveCache(path)
+    cache.put('cost', BOX, ITEMS, (), selection(ITEMS))
+    cache.close()
+    monkeypatch.setattr(solve_cache, 'RECORD_FORMAT', solve_cache.RECORD_FORMAT + 1)
+    cache = SolveCache(path)
+    assert cache.get('cost', BOX, ITEMS, ()) is None
+    assert cache.nearest('cost', BOX, ITEMS, ()) is None
+    assert cache.stats()['entries'] == 1
@@ -0,0 +1,31 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from conftest import BASELINE, as_lists
+from linear_optimizer_controller import speculative_cwnd, speculative_ack
+from runner import PackingSession
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with ProcessPoolExecutor(2) as executor:
+        yield executor
+
+
+@pytest.mark.parametrize('search', [speculative_cwnd, speculative_ack], ids=lambda search: search.__name__)
+def test_worker_probes_match_serial_probes(search, executor):
+    case = BASELINE[1]
+    uld = case['uld']
+    args = (lambda new, old: new > old,) if search is speculative_ack else (uld[1] * uld[2] * uld[3], lambda new, old: new > old)
+    packings = []
+    for pool in (None, executor):
+        session = PackingSession([0, case['items'][:8]], uld, case['stable'])
+        result = search(session, case['items'][8:], session.result, *args, pool, 3)
+        # Adopted worker packings are committed like serial ones
+        assert as_lists(session.result) == as_lists(result)
+        session.rollback()
+        assert as_lists(session.result) == as_lists(result)
+        packings.append(as_lists(result))
+    assert packings[0] == packings[1]
+    assert len(packings[0][1]) > 8
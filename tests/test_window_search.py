@@ -0,0 +1,69 @@
+import pytest
+
+from conftest import BASELINE, as_lists
+from runner import PackingSession
+from window_search import adaptive_window
+
+
+class StubSession:
+    # Records the window sizes tried, result[0] is the number of parcels of the window
+    def __init__(self):
+        self.sizes = []
+        self.commits = 0
+
+    def try_extend(self, extra_items):
+        self.sizes.append(len(extra_items))
+        return [len(extra_items), [], [], len(extra_items)]
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def search(n, limit, **kwargs):
+    # Windows of up to limit parcels are accepted
+    session = StubSession()
+    result = adaptive_window(session, list(range(n)), [0, [], [], 0], lambda new, old: new <= limit, **kwargs)
+    return session, result
+
+
+def test_empty_items_do_not_pack():
+    session, result = search(0, 10)
+    assert session.sizes == [] and result == [0, [], [], 0]
+
+
+def test_window_doubles_up_to_the_item_count():
+    session, result = search(10, 10)
+    assert session.sizes == [1, 2, 4, 8, 10]
+    assert result[0] == 10 and session.commits == 5
+
+
+def test_binary_search_between_accepted_and_rejected():
+    session, result = search(40, 5)
+    assert session.sizes == [1, 2, 4, 8, 6, 5]
+    assert result[0] == 5
+
+
+@pytest.mark.parametrize('precision, sizes', [
+    (0.25, [1, 2, 4, 8, 16, 32, 64, 128, 96, 80]),
+    (0, [1, 2, 4, 8, 16, 32, 64, 128, 96, 80, 72, 68, 70, 71]),
+])
+def test_binary_search_stops_at_precision(precision, sizes):
+    session, result = search(200, 70, precision=precision)
+    assert session.sizes == sizes
+    assert result[0] == (64 if precision else 70)
+
+
+def test_fill_volume_stops_the_search():
+    session, result = search(40, 100, fill_volume=4)
+    assert session.sizes == [1, 2, 4]
+
+
+def test_accepted_windows_are_committed():
+    case = BASELINE[0]
+    session = PackingSession([0, case['items'][:10]], case['uld'])
+    result = adaptive_window(session, case['items'][10:], session.result, lambda new, old: new > old)
+    assert result[3] >= as_lists(PackingSession([0, case['items'][:10]], case['uld']).result)[3]
+    assert as_lists(session.result) == as_lists(result)
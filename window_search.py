@@ -0,0 +1,28 @@
+def adaptive_window(session, items, packed_items, accept, fill_volume=None, precision=0.25):
+    '''
+    Window search over the last parcels of items, replacing the cwnd and
+    ack_count loops. The window doubles while its packing is accepted, then
+    a binary search runs between the last accepted and the first rejected
+    size, so a search costs O(log n) packs. The binary search stops once
+    the gap is within precision of the accepted size, the last halvings
+    rarely find a window and each rejected one costs a full pack. Accepted
+    windows are committed and later ones are packed on top of them.
+    Windows that cannot add a parcel are answered by the session's pack
+    filter without packing. With fill_volume the search stops once the
+    packed volume reaches it. Returns the resulting pack_items result.
+    '''
+    n = len(items)
+    low, high = 0, None
+    while (low < n) if high is None else (high - low > max(1, int(low * precision))):
+        if fill_volume is not None and packed_items[0] >= fill_volume:
+            break
+        size = min(2 * low or 1, n) if high is None else (low + high) // 2
+        new_packing = session.try_extend(items[-size:])
+        if accept(new_packing[3], packed_items[3]):
+            session.commit()
+            packed_items = new_packing
+            low = size
+        else:
+            session.rollback()
+            high = size
+    return packed_items